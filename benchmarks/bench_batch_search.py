@@ -0,0 +1,66 @@
+"""
+Batch search: 100 single queries vs one vectorised batch.
+
+    python -m benchmarks.bench_batch_search --size 200000 --batch 100
+
+Both paths run the same pipeline as /search (vectorize, top-k, grouping,
+ranking); the batch path transforms all queries into one sparse matrix and
+scores them with a single sparse-sparse product.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.grouping import group_candidates
+from src.preprocessing import normalize_text
+from src.product_store import ProductStore
+from src.ranking import Ranker
+from src.retrieval import build_inverted_index, top_k_similar, top_k_similar_batch
+from .synthetic import make_catalog, make_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=20)
+    args = parser.parse_args()
+
+    df = make_catalog(args.size)
+    df["search_text"] = (df["name"] + " " + df["brand"]).map(normalize_text)
+    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+    inverted_index = build_inverted_index(vectorizer.fit_transform(df["search_text"]))
+    store = ProductStore(df)
+    ranker = Ranker()
+    queries = make_queries(df, args.batch)
+
+    def rank(positions, scores):
+        groups = group_candidates(store, list(zip(positions.tolist(), scores.tolist())))
+        return ranker.rank_results(groups) if groups else []
+
+    def single_calls():
+        return [rank(*top_k_similar(vectorizer.transform([normalize_text(q)]), inverted_index, args.top_n))
+                for q in queries]
+
+    def one_batch():
+        query_matrix = vectorizer.transform([normalize_text(q) for q in queries])
+        return [rank(*hit) for hit in top_k_similar_batch(query_matrix, inverted_index, args.top_n)]
+
+    assert single_calls() == one_batch(), "batch results differ from single queries"
+
+    for name, fn in (("single calls", single_calls), ("one batch", one_batch)):
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        print(f"{args.batch} queries, {name:<12} | median {np.median(times) * 1000:8.1f} ms "
+              f"| per query {np.median(times) / args.batch * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Grouping microbenchmark: linear scan over groups vs hash-blocked grouping.
+
+    python -m benchmarks.bench_grouping --size 200000 --top-n 20 50 200 1000
+
+Candidates come from real retrieval over a synthetic catalog; both
+implementations must produce identical groups.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.grouping import group_candidates
+from src.preprocessing import normalize_text
+from src.product_store import ProductStore
+from src.retrieval import build_inverted_index, top_k_similar
+from .synthetic import make_catalog, make_queries
+
+
+def linear_group_candidates(store, candidates):
+    """Reference: the pre-blocking grouping loop from SearchEngine.search."""
+    final_groups = []
+    for idx, score in candidates:
+        qty = float(store.match_qty[idx])
+        unit = store.match_unit(idx)
+        tokens = store.name_tokens[idx]
+        brand = store.brand_lower(idx)
+        price = float(store.price[idx]) if store.price[idx] == store.price[idx] else 0.0
+        discounted_price = store.discounted_price[idx]
+        store_info = {
+            "store_name": store.store_name(idx),
+            "price": price,
+            "url": store.urls[idx],
+            "discounted_price": float(discounted_price) if discounted_price == discounted_price else None
+        }
+
+        found_group = False
+        for group in final_groups:
+            if group['unit'] == unit and abs(group['qty'] - qty) < 0.001:
+                joins = brand == group['brand'] and brand != "" and len(tokens.intersection(group['tokens'])) > 0
+                if not joins and group['min_price'] > 0 and (0.6 <= (price / group['min_price']) <= 1.6):
+                    overlap = len(tokens.intersection(group['tokens'])) / max(len(tokens), len(group['tokens']))
+                    joins = overlap > 0.6
+                if joins:
+                    existing = next((s for s in group['all_prices'] if s['store_name'] == store_info['store_name']), None)
+                    if existing:
+                        if store_info['price'] < existing['price']:
+                            existing.update(store_info)
+                    else:
+                        group['all_prices'].append(store_info)
+                    group['min_price'] = min(group['min_price'], price)
+                    if score > group['similarity_score']:
+                        group['similarity_score'] = score
+                    found_group = True
+                    break
+
+        if not found_group:
+            product = store.record(idx)
+            product['name'] = store.base_names[idx]
+            product['similarity_score'] = score
+            product['all_prices'] = [store_info]
+            final_groups.append({**product, "tokens": tokens, "brand": brand, "unit": unit, "qty": qty, "min_price": price})
+
+    for g in final_groups:
+        g['all_prices'] = sorted(g['all_prices'], key=lambda x: x['price'])
+        for key in ['tokens', 'min_price', 'qty']:
+            g.pop(key, None)
+    return final_groups
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-n", type=int, nargs="+", default=[20, 50, 200, 1000])
+    args = parser.parse_args()
+
+    df = make_catalog(args.size)
+    df["search_text"] = (df["name"] + " " + df["brand"]).map(normalize_text)
+    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+    inverted_index = build_inverted_index(vectorizer.fit_transform(df["search_text"]))
+    store = ProductStore(df)
+    queries = [normalize_text(q) for q in make_queries(df, args.queries)]
+
+    for top_n in args.top_n:
+        linear_times, blocked_times, mismatches = [], [], 0
+        for q in queries:
+            positions, scores = top_k_similar(vectorizer.transform([q]), inverted_index, top_n)
+            candidates = list(zip(positions.tolist(), scores.tolist()))
+
+            expected, t_linear = timed(linear_group_candidates, store, candidates)
+            actual, t_blocked = timed(group_candidates, store, candidates)
+            linear_times.append(t_linear)
+            blocked_times.append(t_blocked)
+            mismatches += expected != actual
+
+        lin = np.array(linear_times) * 1000
+        blk = np.array(blocked_times) * 1000
+        print(f"top_n {top_n:>5} | linear p50 {np.percentile(lin, 50):8.3f} ms p99 {np.percentile(lin, 99):8.3f} ms "
+              f"| blocked p50 {np.percentile(blk, 50):7.3f} ms p99 {np.percentile(blk, 99):7.3f} ms "
+              f"| mismatches {mismatches}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
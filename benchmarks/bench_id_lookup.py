@@ -0,0 +1,54 @@
+"""
+Product id lookup cost vs catalog size.
+
+    python -m benchmarks.bench_id_lookup --sizes 10000 100000 1000000
+
+Compares the old boolean-mask filter on products_df with the id -> row
+position hash index in ProductStore.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.product_store import ProductStore
+from .synthetic import make_catalog
+
+
+def per_call_us(fn, ids):
+    start = time.perf_counter()
+    for product_id in ids:
+        fn(product_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        df = make_catalog(size)
+        store = ProductStore(df)
+        ids = np.random.default_rng(0).integers(1, size + 1, args.lookups).tolist()
+
+        def mask_lookup(product_id):
+            match = df[df['id'] == product_id]
+            return None if match.empty else match.iloc[0]
+
+        def index_lookup(product_id):
+            pos = store.position(product_id)
+            return None if pos is None else store.record(pos)
+
+        # The mask filter is slow at scale; a few hundred calls are enough
+        mask_us = per_call_us(mask_lookup, ids[:200])
+        index_us = per_call_us(index_lookup, ids)
+        position_us = per_call_us(store.position, ids)
+        print(f"{size:>9,} products | products_df mask {mask_us:9.1f} us "
+              f"| id index {position_us:6.2f} us | id index + record {index_us:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
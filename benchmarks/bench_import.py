@@ -0,0 +1,53 @@
+"""
+Import cost of the API module.
+
+    python -m benchmarks.bench_import --repeats 5
+
+Each measurement is a fresh Python process. "lazy" imports `src.api` as it
+is now: no DB connection, no index, and the index modules not loaded.
+"eager" also imports the index modules (pandas, scikit-learn, SciPy,
+RapidFuzz), which is what every `import src.api` used to load at the top
+level. Before lifespan-managed start-up, that import also connected to the
+DB and built the whole index, which is not included here.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+HEAVY = ["pandas", "sklearn", "scipy", "rapidfuzz"]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import src.api
+if sys.argv[1] == "eager":
+    import src.snapshot, src.index_bundle, src.clustering
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+""" % HEAVY
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for mode in ("lazy", "eager"):
+        runs = []
+        for _ in range(args.repeats):
+            out = subprocess.run([sys.executable, "-c", CHILD, mode], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.splitlines()[-1]))
+        seconds = np.median([r["seconds"] for r in runs])
+        heavy = ", ".join(runs[0]["heavy"]) or "none"
+        print(f"import src.api, {mode:<5} | median {seconds * 1000:7.1f} ms | heavy modules loaded: {heavy}")
+
+
+if __name__ == "__main__":
+    main()
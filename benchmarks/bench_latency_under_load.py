@@ -0,0 +1,102 @@
+"""
+/search latency under concurrent load, in-process through the ASGI app.
+
+    python -m benchmarks.bench_latency_under_load --size 100000 --concurrency 8 32 128
+
+Each of --concurrency clients sends searches back to back for --seconds,
+with the result cache off so every request runs the pipeline; a client
+that is rejected (429 or 503) waits 100 ms before its next request. Two
+settings are compared:
+
+    unbounded  no admission limit, no queue limit and no deadline, as with
+               Starlette's default threadpool: every request waits for its
+               turn however long
+    bounded    the default /search admission limits (or SEARCH_ADMIT_SEARCH),
+               --queue jobs queued or running on the executor and
+               --deadline-ms per request; the overflow gets a fast 429 or
+               503 instead of a slow 200
+
+Reports throughput, p50/p95/p99 of successful responses and the number of
+rejections (429s and 503s). No database: the index is built from a
+synthetic catalog and published on the engine directly.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from .synthetic import make_catalog, make_queries
+
+
+async def load(client, queries, concurrency, seconds, backoff=0.1):
+    latencies, rejected = [], 0
+    stop = time.perf_counter() + seconds
+
+    async def user(offset):
+        nonlocal rejected
+        i = offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = await client.get("/search", params={"query": queries[i % len(queries)]})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            elif response.status_code in (429, 503):
+                # Back off like a client honouring Retry-After, scaled down
+                rejected += 1
+                await asyncio.sleep(backoff)
+            else:
+                response.raise_for_status()
+            i += concurrency
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return np.array(latencies) * 1000, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--deadline-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    os.environ["SEARCH_CACHE_MAX_ENTRIES"] = "0"
+    import httpx
+    from src import api
+    from src.admission import Admission
+    from src.executor import CPUExecutor
+    from src.snapshot import build_snapshot
+
+    df = make_catalog(args.size)
+    queries = make_queries(df, 2000)
+    api.search_engine.snapshot = build_snapshot(df)
+
+    bounded_admission = api.admission
+    unbounded_admission = Admission({"search": (1 << 30, 1 << 30)}, timeout=None)
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await load(client, queries, 1, 1.0)  # warm up
+            for concurrency in args.concurrency:
+                for name, admission, max_pending, deadline_ms in (
+                        ("unbounded", unbounded_admission, 1 << 30, 0),
+                        ("bounded", bounded_admission, args.queue, args.deadline_ms)):
+                    api.admission = admission
+                    api.cpu_executor = CPUExecutor(args.workers, max_pending)
+                    api.DEADLINE_MS = deadline_ms
+                    latencies, rejected = await load(client, queries, concurrency, args.seconds)
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+                    print(f"{concurrency:4d} clients, {name:<9} | {len(latencies) / args.seconds:7.1f} ok/s "
+                          f"| p50 {p50:8.1f} ms | p95 {p95:8.1f} ms | p99 {p99:8.1f} ms | 429/503 {rejected:6d}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Retrieval latency: dense cosine + full argsort vs sparse top-k.
+
+    python -m benchmarks.bench_retrieval --sizes 50000 250000 1000000
+
+Reports p50/p99 per query for both paths and how many rankings differ:
+
+    vs old       against the original dense code, unchanged (default,
+                 unstable argsort); "tie order only" counts those whose
+                 scores match position by position, so only the order or
+                 choice among tied products differs
+    vs stable    against the dense path with a stable argsort, whose tie
+                 order (highest row position first) the sparse path keeps
+
+The sparse path changes only the order of tied results. Exits with status 1
+if any ranking differs from the old code other than in tie order, or
+differs from the stable-sort version at all.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.preprocessing import normalize_text
+from src.retrieval import build_inverted_index, top_k_similar
+from .synthetic import make_catalog, make_queries
+
+
+def dense_top_k(query_vec, tfidf_matrix, k, kind=None):
+    """The original search path; kind="stable" makes its tie order defined."""
+    similarities = cosine_similarity(query_vec, tfidf_matrix).flatten()
+    top = similarities.argsort(kind=kind)[-k:][::-1]
+    top = top[similarities[top] > 0]
+    return top, similarities[top]
+
+
+def same_scores(a, b):
+    return len(a) == len(b) and np.allclose(a, b, rtol=0, atol=1e-12)
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def run(size, n_queries, top_n):
+    df = make_catalog(size)
+    search_text = (df["name"] + " " + df["brand"]).map(normalize_text)
+    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+    tfidf_matrix = vectorizer.fit_transform(search_text)
+    inverted_index = build_inverted_index(tfidf_matrix)
+
+    queries = [normalize_text(q) for q in make_queries(df, n_queries)]
+    dense_times, sparse_times = [], []
+    differ_old = tie_only = differ_stable = 0
+    for q in queries:
+        query_vec = vectorizer.transform([q])
+
+        start = time.perf_counter()
+        dense_idx, dense_scores = dense_top_k(query_vec, tfidf_matrix, top_n)
+        dense_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        sparse_idx, sparse_scores = top_k_similar(query_vec, inverted_index, top_n)
+        sparse_times.append(time.perf_counter() - start)
+
+        if not (np.array_equal(dense_idx, sparse_idx) and same_scores(dense_scores, sparse_scores)):
+            differ_old += 1
+            tie_only += same_scores(dense_scores, sparse_scores)
+        stable_idx, stable_scores = dense_top_k(query_vec, tfidf_matrix, top_n, kind="stable")
+        if not (np.array_equal(stable_idx, sparse_idx) and same_scores(stable_scores, sparse_scores)):
+            differ_stable += 1
+
+    d50, d99 = percentiles(dense_times)
+    s50, s99 = percentiles(sparse_times)
+    print(f"{size:>9,} products | dense p50 {d50:8.2f} ms p99 {d99:8.2f} ms "
+          f"| sparse p50 {s50:7.2f} ms p99 {s99:7.2f} ms | rankings differing vs old {differ_old}/{len(queries)} "
+          f"(tie order only {tie_only}), vs stable {differ_stable}/{len(queries)}")
+    return differ_old - tie_only + differ_stable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 250_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=20)
+    args = parser.parse_args()
+
+    failures = sum(run(size, args.queries, args.top_n) for size in args.sizes)
+    if failures:
+        print(f"{failures} rankings differ beyond tie order")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
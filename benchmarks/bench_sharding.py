@@ -0,0 +1,84 @@
+"""
+Search throughput with the index split across shard processes.
+
+    python -m benchmarks.bench_sharding --size 1000000 --shards 1 2 4 8
+
+--clients threads send searches back to back for --seconds, like executor
+threads serving /search. "in-process" scores the whole inverted index in the
+calling thread; "N shards" scatters each query to N shard processes and
+merges their local top-k. Only retrieval (vectorize, score, top-k) is timed;
+grouping and ranking are the same in both modes. Before timing, every
+sharded result is checked against the in-process one.
+
+Scaling needs as many free cores as shards plus one for the caller.
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.preprocessing import normalize_text
+from src.retrieval import top_k_similar
+from src.sharding import ShardedIndex
+from src.snapshot import build_snapshot
+from .synthetic import make_catalog, make_queries
+
+
+def throughput(search, queries, clients, seconds):
+    done = [0] * clients
+    stop = time.perf_counter() + seconds
+
+    def client(i):
+        j = i
+        while time.perf_counter() < stop:
+            search(queries[j % len(queries)])
+            done[i] += 1
+            j += clients
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--by", choices=["hash", "store"], default="hash")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--top-n", type=int, default=20)
+    args = parser.parse_args()
+
+    df = make_catalog(args.size)
+    queries = make_queries(df, 1000)
+    snap = build_snapshot(df)
+    vectors = {q: snap.vectorizer.transform([normalize_text(q)]) for q in queries}
+    print(f"{args.size:,} products, {os.cpu_count()} CPUs, {args.clients} clients")
+
+    qps = throughput(lambda q: top_k_similar(vectors[q], snap.inverted_index, args.top_n),
+                     queries, args.clients, args.seconds)
+    print(f"in-process | {qps:8.1f} queries/s")
+
+    for n_shards in args.shards:
+        shards = ShardedIndex(snap, n_shards, by=args.by)
+        try:
+            for q in queries[:200]:
+                expected = top_k_similar(vectors[q], snap.inverted_index, args.top_n)
+                got = shards.top_k(vectors[q], args.top_n)
+                assert np.array_equal(got[0], expected[0]) and np.allclose(got[1], expected[1]), q
+            qps = throughput(lambda q: shards.top_k(vectors[q], args.top_n),
+                             queries, args.clients, args.seconds)
+            print(f"{n_shards:2d} shards  | {qps:8.1f} queries/s | shard sizes {min(shards.sizes):,}-{max(shards.sizes):,}")
+        finally:
+            shards.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold start: building the index vs memory-mapping a persisted bundle.
+
+    python -m benchmarks.bench_startup --sizes 10000 100000 1000000
+
+For each size, a synthetic catalog is indexed from scratch (TF-IDF fit,
+product store, clustering, neighbour table; the DB read is not included)
+and written as a bundle. A fresh Python process then imports the search
+stack, loads the bundle and answers one query, which is what a worker
+start costs with SEARCH_INDEX_PATH set. The bundle's pages are usually
+still in the OS page cache, so this is a warm-disk start.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.index_bundle import save_bundle
+from src.snapshot import build_snapshot
+from .synthetic import make_catalog, make_queries
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from src.index_bundle import load_bundle
+from src.grouping import group_candidates
+from src.preprocessing import normalize_text
+from src.retrieval import top_k_similar
+imported = time.perf_counter()
+snap = load_bundle(sys.argv[1])
+loaded = time.perf_counter()
+positions, scores = top_k_similar(snap.vectorizer.transform([normalize_text(sys.argv[2])]), snap.inverted_index, 20)
+group_candidates(snap.product_store, list(zip(positions.tolist(), scores.tolist())))
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "load": loaded - imported, "first_query": done - loaded}))
+"""
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for size in args.sizes:
+        df = make_catalog(size)
+        query = make_queries(df, 1)[0]
+
+        start = time.perf_counter()
+        snapshot = build_snapshot(df)
+        build = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            path = save_bundle(snapshot, tmp)
+            save = time.perf_counter() - start
+
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", CHILD, path, query], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout
+            total = time.perf_counter() - start
+            child = json.loads(out.splitlines()[-1])
+            size_mb = dir_size(path) / 1e6
+
+        print(f"{size:>9,} products | build {build:7.2f} s | save {save:5.2f} s ({size_mb:6.1f} MB) "
+              f"| new process: import {child['import']:5.2f} s, load {child['load']:5.2f} s, "
+              f"first query {child['first_query'] * 1000:6.1f} ms, total {total:5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Thundering herd: many concurrent identical searches on a cold cache.
+
+    python -m benchmarks.bench_thundering_herd --size 200000 --clients 300
+
+Clients ask /search for the same query, spread evenly over --window-ms as
+when a promotion goes live. The requests go through the ASGI app
+in-process (httpx, no sockets), so they take the endpoint's path: result
+cache, single-flight, admission and the CPU executor (sized by
+SEARCH_EXECUTOR_WORKERS as in production). Reports how many times the
+search pipeline ran, how many requests shared a run or hit the cache, the
+status codes, and process CPU time and wall time, for --rounds cold-cache
+rounds.
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from .synthetic import make_catalog, make_queries
+
+
+async def herd(client, query, clients, window):
+    async def request(i):
+        await asyncio.sleep(window * i / clients)
+        return await client.get("/search", params={"query": query})
+
+    return await asyncio.gather(*(request(i) for i in range(clients)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--window-ms", type=float, default=100.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    import httpx
+
+    from src import api
+    from src.clustering import cluster_products
+    from src.snapshot import build_snapshot
+
+    df = make_catalog(args.size)
+    df["canonical_product_id"] = cluster_products(df)
+    api.search_engine._publish(build_snapshot(df))
+    queries = make_queries(df, args.rounds)
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        limits = httpx.Limits(max_connections=args.clients)
+        async with httpx.AsyncClient(transport=transport, base_url="http://herd", timeout=60, limits=limits) as client:
+            for query in queries:
+                api.result_cache.clear()
+                flight, cache = api.in_flight.stats(), api.result_cache.stats()["local"]
+                cpu, wall = time.process_time(), time.perf_counter()
+                responses = await herd(client, query, args.clients, args.window_ms / 1000)
+                cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+
+                runs = api.in_flight.stats()["executions"] - flight["executions"]
+                shared = api.in_flight.stats()["shared"] - flight["shared"]
+                hits = api.result_cache.stats()["local"]["hits"] - cache["hits"]
+                statuses = Counter(r.status_code for r in responses)
+                bodies = {r.content for r in responses if r.status_code == 200}
+                assert len(bodies) <= 1, "clients saw different results"
+                codes = " ".join(f"{k}:{v}" for k, v in sorted(statuses.items()))
+                print(f"{args.clients} clients | pipeline runs {runs:4d} | shared {shared:4d} | cache hits {hits:4d} "
+                      f"| {codes} | CPU {cpu * 1000:9.1f} ms | wall {wall * 1000:9.1f} ms")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Memory per uvicorn-style worker: private index copies vs one shared bundle.
+
+    python -m benchmarks.bench_worker_memory --size 100000 --workers 4
+
+"private" workers each build their own index from the catalog, as every
+worker did before bundles. "shared" workers memory-map one published
+bundle. "no index" workers only import the search stack, for reference.
+Each worker serves a batch of searches and recommendations so its pages
+are touched, then all workers report at the same time:
+
+    RSS  resident pages, counting shared pages in full in every worker
+    PSS  shared pages divided among the processes mapping them
+    USS  pages private to the worker
+
+Linux only (reads /proc/self/smaps_rollup).
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+
+from .synthetic import make_catalog, make_queries
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def worker(mode, source, queries, barrier, results):
+    from src.grouping import group_candidates
+    from src.preprocessing import normalize_text
+    from src.retrieval import top_k_similar
+
+    from src.index_bundle import load_bundle
+    from src.snapshot import build_snapshot
+
+    if mode == "no index":
+        barrier.wait()
+        results.put(memory_kb())
+        barrier.wait()
+        return
+    if mode == "private":
+        with open(source, "rb") as f:
+            snap = build_snapshot(pickle.load(f))
+    else:
+        snap = load_bundle(source)
+
+    for query in queries:
+        positions, scores = top_k_similar(snap.vectorizer.transform([normalize_text(query)]), snap.inverted_index, 20)
+        group_candidates(snap.product_store, list(zip(positions.tolist(), scores.tolist())))
+    rows = list(range(0, snap.product_store.size, max(1, snap.product_store.size // 200)))
+    for entries in snap.neighbors.lookup(rows, 6):
+        for pos, *_ in entries:
+            snap.product_groups.group(pos)
+
+    barrier.wait()
+    results.put(memory_kb())
+    barrier.wait()
+
+
+def run(ctx, mode, source, queries, n_workers):
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, source, queries, barrier, results)) for _ in range(n_workers)]
+    for p in procs:
+        p.start()
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    from src.clustering import cluster_products
+    from src.index_bundle import save_bundle
+    from src.snapshot import build_snapshot
+
+    df = make_catalog(args.size)
+    queries = make_queries(df, args.queries)
+    # Cluster once, like the canonical ids stored by ingestion
+    df["canonical_product_id"] = cluster_products(df)
+    snapshot = build_snapshot(df.copy())
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = os.path.join(tmp, "catalog.pkl")
+        with open(catalog, "wb") as f:
+            pickle.dump(df, f)
+        bundle = save_bundle(snapshot, os.path.join(tmp, "index"))
+
+        for mode, source in (("no index", None), ("private", catalog), ("shared", bundle)):
+            reports = run(ctx, mode, source, queries, args.workers)
+            mean = {k: sum(r[k] for r in reports) / len(reports) / 1024 for k in ("rss", "pss", "uss")}
+            print(f"{args.size:,} products, {args.workers} workers, {mode:<8} | per worker: RSS {mean['rss']:7.1f} MB "
+                  f"| PSS {mean['pss']:7.1f} MB | USS {mean['uss']:7.1f} MB | total PSS {mean['pss'] * args.workers:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
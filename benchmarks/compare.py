@@ -0,0 +1,53 @@
+"""
+Compare two benchmark suite result files.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Prints median latency per benchmark and catalog size in both runs, the
+ratio new/old, and flags ratios above 1 + --threshold as regressions. Exits
+with status 1 when there is a regression, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=0.1, out=sys.stdout):
+    """Print the comparison; returns the number of regressions."""
+    before = {(r["benchmark"], r["size"]): r for r in old["results"]}
+    regressions = 0
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}", file=out)
+    for r in new["results"]:
+        base = before.get((r["benchmark"], r["size"]))
+        if base is None:
+            print(f"{r['benchmark']:<24} {r['size']:>9,} | {'':>10} -> {r['p50_ms']:10.3f} ms | new", file=out)
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "faster"
+        print(f"{r['benchmark']:<24} {r['size']:>9,} | {base['p50_ms']:10.3f} -> {r['p50_ms']:10.3f} ms "
+              f"| x{ratio:5.2f} {flag}", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+    sys.exit(1 if compare(load(args.old), load(args.new), args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Relevance vs. latency of search engine configurations, against a golden set.
+
+    python -m benchmarks.evaluate --size 100000 --configs exact max_features=2000 ngram=1 shards=4
+    python -m benchmarks.evaluate --write-golden golden.json --size 100000
+    python -m benchmarks.evaluate --golden golden.json --configs max_features=1000
+
+The golden set is built from the catalog's cross-store groups (canonical
+ids): each query is a product's name, with or without its size. For a full
+name the product's own group is relevant with grade 2, and groups of the
+same product in another size or pack with grade 1; for a name without size
+all of those get grade 2. A saved golden set records the catalog it came
+from (synthetic size and seed, or --from-db) and is evaluated on that.
+
+Every configuration is compared with "exact", today's SearchEngine.search:
+
+    recall@k   relevant groups in the top k / min(k, relevant groups)
+    ndcg@k     graded NDCG over the top k groups
+    overlap@k  share of exact's top k groups also in the top k
+
+plus p50/p95 search latency and the index's memory in this process
+(tracemalloc: retained after the build, and build peak). Configurations
+are comma-separated key=value pairs:
+
+    max_features=N   TF-IDF vocabulary size (default 5000)
+    ngram=N          longest n-gram (default 2)
+    shards=N         scatter-gather over N shard processes (memory of the
+                     shard processes is not included)
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from .synthetic import make_catalog
+
+
+def relevance_keys(catalog):
+    """Canonical id and product family (name without size and branch) per row."""
+    from src.clustering import cluster_products, match_name
+
+    canonical = catalog.get("canonical_product_id")
+    if canonical is None or canonical.isna().any():
+        catalog["canonical_product_id"] = cluster_products(catalog)
+    catalog["family"] = catalog["brand"].fillna("").str.lower() + "|" + catalog["name"].map(match_name)
+    return catalog
+
+
+def build_golden(catalog, n_queries, seed=5):
+    """Golden queries with graded relevant canonical ids."""
+    from src.clustering import SIZE_PATTERN
+
+    rng = np.random.default_rng(seed)
+    family_groups = catalog.groupby("family")["canonical_product_id"].agg(lambda ids: sorted(set(ids.tolist())))
+    picks = rng.choice(len(catalog), n_queries, replace=False)
+    golden = []
+    for i, pos in enumerate(picks.tolist()):
+        row = catalog.iloc[pos]
+        name = row["name"].split(" [")[0]
+        target = int(row["canonical_product_id"])
+        family = family_groups[row["family"]]
+        if i % 2 == 0:
+            relevant = {str(c): 1 for c in family}
+            relevant[str(target)] = 2
+            query = name
+        else:
+            relevant = {str(c): 2 for c in family}
+            query = " ".join(SIZE_PATTERN.sub(" ", name.lower()).split())
+        golden.append({"query": query, "relevant": relevant})
+    return golden
+
+
+def parse_config(text):
+    if text == "exact":
+        return {}
+    config = {}
+    for part in text.split(","):
+        key, _, value = part.partition("=")
+        if key not in ("max_features", "ngram", "shards"):
+            raise SystemExit(f"Unknown configuration key {key!r}")
+        config[key] = int(value)
+    return config
+
+
+def make_engine(catalog, config):
+    """A SearchEngine serving `config`; returns (engine, retained bytes, peak bytes)."""
+    from src.search import SearchEngine
+    from src.snapshot import VECTORIZER_PARAMS, build_snapshot
+
+    params = dict(VECTORIZER_PARAMS)
+    if "max_features" in config:
+        params["max_features"] = config["max_features"]
+    if "ngram" in config:
+        params["ngram_range"] = (1, config["ngram"])
+
+    tracemalloc.start()
+    engine = SearchEngine()
+    engine.snapshot = build_snapshot(catalog.drop(columns=["family"]), vectorizer_params=params)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if config.get("shards", 0) > 1:
+        from src.sharding import ShardedIndex
+        engine.shards = ShardedIndex(engine.snapshot, config["shards"])
+    return engine, retained, peak
+
+
+def ranked_groups(engine, canonical_of, query, k):
+    """Canonical ids of the search results, best first, each once."""
+    seen = []
+    for group in engine.search(query, top_n=k):
+        canonical = canonical_of.get(group["id"])
+        if canonical not in seen:
+            seen.append(canonical)
+    return seen[:k]
+
+
+def ndcg(ranked, relevant, k):
+    gains = [relevant.get(str(c), 0) for c in ranked[:k]]
+    dcg = sum((2 ** g - 1) / np.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / np.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def evaluate(engine, golden, canonical_of, k, exact=None):
+    rankings, seconds = [], []
+    for item in golden[:10]:
+        engine.search(item["query"], top_n=k)
+    for item in golden:
+        start = time.perf_counter()
+        rankings.append(ranked_groups(engine, canonical_of, item["query"], k))
+        seconds.append(time.perf_counter() - start)
+
+    recall, ndcgs, overlap = [], [], []
+    for i, (item, ranked) in enumerate(zip(golden, rankings)):
+        relevant = item["relevant"]
+        hits = sum(1 for c in ranked if str(c) in relevant)
+        recall.append(hits / min(k, len(relevant)))
+        ndcgs.append(ndcg(ranked, relevant, k))
+        if exact is not None:
+            overlap.append(len(set(ranked) & set(exact[i])) / max(1, len(exact[i])))
+    ms = np.asarray(seconds) * 1000
+    return rankings, {
+        f"recall@{k}": float(np.mean(recall)),
+        f"ndcg@{k}": float(np.mean(ndcgs)),
+        f"overlap@{k}": float(np.mean(overlap)) if overlap else 1.0,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=["exact", "max_features=2000", "ngram=1"])
+    parser.add_argument("--size", type=int, default=100_000, help="synthetic catalog size")
+    parser.add_argument("--seed", type=int, default=42, help="synthetic catalog seed")
+    parser.add_argument("--from-db", action="store_true", help="use the products table instead of a synthetic catalog")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--golden", help="evaluate this saved golden set")
+    parser.add_argument("--write-golden", help="save the golden set to this file")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    source = {"from_db": args.from_db, "size": args.size, "seed": args.seed}
+    golden = None
+    if args.golden:
+        with open(args.golden) as f:
+            saved = json.load(f)
+        source, golden = saved["catalog"], saved["queries"]
+
+    if source["from_db"]:
+        from src.snapshot import load_products_df
+        catalog = load_products_df()
+    else:
+        catalog = make_catalog(source["size"], seed=source["seed"])
+    catalog = relevance_keys(catalog)
+    canonical_of = dict(zip(catalog["id"].tolist(), catalog["canonical_product_id"].tolist()))
+
+    if golden is None:
+        golden = build_golden(catalog, min(args.queries, len(catalog)))
+    if args.write_golden:
+        with open(args.write_golden, "w") as f:
+            json.dump({"catalog": source, "queries": golden}, f)
+        print(f"Golden set of {len(golden)} queries written to {args.write_golden}")
+
+    configs = ["exact"] + [c for c in args.configs if c != "exact"]
+    exact, rows = None, []
+    print(f"{len(catalog):,} products, {len(golden)} golden queries, k={args.k}")
+    for name in configs:
+        engine, retained, peak = make_engine(catalog, parse_config(name))
+        try:
+            rankings, scores = evaluate(engine, golden, canonical_of, args.k, exact)
+        finally:
+            if engine.shards is not None:
+                engine.shards.close()
+        if exact is None:
+            exact = rankings
+        scores.update(config=name, index_mb=retained / 2**20, build_peak_mb=peak / 2**20)
+        rows.append(scores)
+        k = args.k
+        print(f"{name:<28} | recall@{k} {scores[f'recall@{k}']:.3f} | ndcg@{k} {scores[f'ndcg@{k}']:.3f} "
+              f"| overlap@{k} {scores[f'overlap@{k}']:.3f} | p50 {scores['p50_ms']:7.2f} ms | p95 {scores['p95_ms']:7.2f} ms "
+              f"| index {scores['index_mb']:7.1f} MB | build peak {scores['build_peak_mb']:7.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"catalog": source, "k": args.k, "queries": len(golden), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+End-to-end load test: replay a query log against the API.
+
+    python -m benchmarks.loadtest --size 100000 --concurrency 32 --requests 5000
+    python -m benchmarks.loadtest --url http://localhost:8000 --log queries.log --cache warm
+
+By default the ASGI app runs in-process (through httpx, no sockets) on an
+index built from a synthetic catalog of --size products. With --url the
+requests go to a running server instead; note that in-process the load
+generator shares the CPU with the app.
+
+The log is one request path per line, e.g. "/search?query=olpers milk" or
+"/recommend/42", or a JSON object with a "path" key (extra keys ignored).
+Without --log a synthetic log is generated from the catalog: --mix sets the
+endpoint shares, and queries and product ids follow a Zipf-like popularity
+so the result cache sees realistic repeats. --write-log saves it for
+replaying later or against a server.
+
+--cache cold clears the in-process result cache first (restart the server
+for a cold run with --url); warm replays the log once before measuring.
+Reports throughput and p50/p95/p99 per endpoint and the status codes seen.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from urllib.parse import quote
+
+import numpy as np
+
+from .synthetic import make_catalog, make_queries
+
+DEFAULT_MIX = "search=0.6,product=0.15,compare=0.1,recommend=0.15"
+
+
+def parse_mix(text):
+    shares = {}
+    for part in text.split(","):
+        name, _, share = part.partition("=")
+        shares[name.strip()] = float(share)
+    return shares
+
+
+def read_log(path):
+    paths = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            paths.append(json.loads(line)["path"] if line.startswith("{") else line)
+    return paths
+
+
+def synthetic_log(catalog, n_requests, mix, seed=3):
+    """Request paths with the given endpoint mix and Zipf-like popularity."""
+    rng = np.random.default_rng(seed)
+    queries = make_queries(catalog, 2000)
+    ids = catalog["id"].to_numpy()
+
+    def popular(n_items):
+        # Zipf-like: item ranks drawn with probability ~ 1/rank
+        weights = 1.0 / np.arange(1, n_items + 1)
+        return rng.choice(n_items, n_requests, p=weights / weights.sum())
+
+    query_pick, id_pick = popular(len(queries)), popular(min(len(ids), 20_000))
+    id_order = rng.permutation(ids)
+    names = list(mix)
+    shares = np.array([mix[name] for name in names])
+    endpoints = rng.choice(len(names), n_requests, p=shares / shares.sum())
+
+    paths = []
+    for i in range(n_requests):
+        endpoint = names[endpoints[i]]
+        if endpoint == "search":
+            paths.append(f"/search?query={quote(queries[query_pick[i]])}")
+        else:
+            paths.append(f"/{endpoint}/{int(id_order[id_pick[i]])}")
+    return paths
+
+
+def endpoint_of(path):
+    return path.split("?")[0].strip("/").split("/")[0] or "/"
+
+
+async def replay(client, paths, concurrency):
+    """Send all paths with `concurrency` clients; per-endpoint latencies and status counts."""
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(paths):
+            path = paths[position]
+            position += 1
+            start = time.perf_counter()
+            try:
+                status = (await client.get(path)).status_code
+            except Exception as e:
+                status = type(e).__name__
+            endpoint = endpoint_of(path)
+            latencies[endpoint].append(time.perf_counter() - start)
+            statuses[endpoint][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def report(latencies, statuses, elapsed):
+    rows = []
+    every = [s for values in latencies.values() for s in values]
+    for endpoint, values in sorted(latencies.items()) + [("all", every)]:
+        ms = np.asarray(values) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        counts = statuses[endpoint] if endpoint != "all" else sum(statuses.values(), Counter())
+        rows.append({"endpoint": endpoint, "requests": len(ms), "per_second": len(ms) / elapsed,
+                     "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                     "statuses": {str(k): v for k, v in counts.items()}})
+        codes = " ".join(f"{k}:{v}" for k, v in sorted(counts.items(), key=lambda kv: str(kv[0])))
+        print(f"{endpoint:<10} | {len(ms):7d} req | {len(ms) / elapsed:8.1f} req/s | p50 {p50:8.2f} ms "
+              f"| p95 {p95:8.2f} ms | p99 {p99:8.2f} ms | {codes}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: the app in-process)")
+    parser.add_argument("--log", help="query log to replay (default: synthetic)")
+    parser.add_argument("--write-log", help="save the replayed log to this file")
+    parser.add_argument("--size", type=int, default=100_000, help="synthetic catalog size")
+    parser.add_argument("--requests", type=int, default=5000, help="synthetic log length")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint shares (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cache", choices=["cold", "warm"], default="cold")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    import httpx
+
+    catalog = None
+    if args.url is None or args.log is None:
+        catalog = make_catalog(args.size)
+    paths = read_log(args.log) if args.log else synthetic_log(catalog, args.requests, parse_mix(args.mix))
+    if args.write_log:
+        with open(args.write_log, "w") as f:
+            f.writelines(p + "\n" for p in paths)
+
+    if args.url is None:
+        from src import api
+        from src.clustering import cluster_products
+        from src.snapshot import build_snapshot
+
+        catalog["canonical_product_id"] = cluster_products(catalog)
+        api.search_engine._publish(build_snapshot(catalog))
+        transport, base_url = httpx.ASGITransport(app=api.app), "http://loadtest"
+    else:
+        transport, base_url = None, args.url
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60, limits=limits) as client:
+            if args.cache == "warm":
+                await replay(client, paths, args.concurrency)
+            elif args.url is None:
+                api.result_cache.clear()
+            else:
+                print("--cache cold against a server: restart it first for an empty cache")
+            return await replay(client, paths, args.concurrency)
+
+    latencies, statuses, elapsed = asyncio.run(run())
+    print(f"{len(paths)} requests, {args.concurrency} clients, {args.cache} cache, "
+          f"{'in-process' if args.url is None else args.url}, {elapsed:.1f} s")
+    rows = report(latencies, statuses, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "elapsed_s": elapsed, "endpoints": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
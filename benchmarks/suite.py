@@ -0,0 +1,176 @@
+"""
+Benchmark suite for the search, ranking and recommendation hot paths.
+
+    python -m benchmarks.suite --sizes 10000 100000 1000000
+    python -m benchmarks.suite --sizes 100000 --compare benchmarks/results/<baseline>.json
+
+For each catalog size a synthetic multi-store catalog is loaded into a
+temporary SQLite database (no Postgres needed), then timed:
+
+    refresh_index (cold)   fresh engine: read the DB, build every index
+    refresh_index (warm)   rebuild on an engine that already has the index,
+                           reusing the unchanged products' features
+    search                 SearchEngine.search over --queries sampled queries
+    rank_results           Ranker.rank_results on each query's groups
+    recommend              Recommender.recommend for sampled product ids
+    search_by_id           SearchEngine.search_by_id, 10% unknown ids
+
+Canonical ids are clustered once and stored, as ingestion does. Every
+benchmark is warmed up once, then run --rounds times. Results (p50, p95, p99
+and mean per call, plus commit and machine details) are written as JSON to
+--out, by default benchmarks/results/<time>-<commit>.json. Compare two runs
+with `python -m benchmarks.compare`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .synthetic import make_catalog, make_queries
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(name, size, seconds):
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    result = {"benchmark": name, "size": size, "calls": len(ms), "p50_ms": float(p50), "p95_ms": float(p95),
+              "p99_ms": float(p99), "mean_ms": float(ms.mean()), "min_ms": float(ms.min())}
+    print(f"{name:<24} {size:>9,} | p50 {p50:10.3f} ms | p95 {p95:10.3f} ms | p99 {p99:10.3f} ms | {len(ms)} calls")
+    return result
+
+
+def timed(fn, args_list, rounds):
+    for args in args_list:
+        fn(*args)
+    seconds = []
+    for _ in range(rounds):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def load_catalog(df):
+    from src.clustering import cluster_products
+    from src.database import Base, get_engine
+    from src import models  # noqa: F401  (registers the tables)
+
+    engine = get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    df = df.copy()
+    df["canonical_product_id"] = cluster_products(df)
+    stores = df[["store_id", "store_name"]].drop_duplicates()
+    stores.rename(columns={"store_id": "id", "store_name": "name"}).to_sql("stores", engine, if_exists="append", index=False)
+    df.drop(columns=["store_name"]).to_sql("products", engine, if_exists="append", index=False, chunksize=10_000)
+
+
+def run_size(size, args):
+    from src.ranking import Ranker
+    from src.recommender import Recommender
+    from src.search import SearchEngine
+
+    df = make_catalog(size)
+    load_catalog(df)
+    results = []
+
+    cold = []
+    for _ in range(args.refresh_repeats):
+        engine = SearchEngine()
+        start = time.perf_counter()
+        engine.refresh_index()
+        cold.append(time.perf_counter() - start)
+    results.append(summarize("refresh_index (cold)", size, cold))
+
+    warm = []
+    for _ in range(args.refresh_repeats):
+        start = time.perf_counter()
+        engine.refresh_index()
+        warm.append(time.perf_counter() - start)
+    results.append(summarize("refresh_index (warm)", size, warm))
+
+    queries = make_queries(df, args.queries)
+    results.append(summarize("search", size, timed(engine.search, [(q,) for q in queries], args.rounds)))
+
+    ranker = Ranker()
+    grouped = [(engine.search(q),) for q in queries]
+    results.append(summarize("rank_results", size, timed(ranker.rank_results, grouped, args.rounds)))
+
+    rng = np.random.default_rng(11)
+    recommender = Recommender(engine)
+    ids = [(int(i),) for i in rng.choice(df["id"].to_numpy(), args.ids)]
+    results.append(summarize("recommend", size, timed(recommender.recommend, ids, args.rounds)))
+
+    # 10% of the lookups miss
+    lookups = ids + [(size + 1 + i,) for i in range(max(1, args.ids // 10))]
+    results.append(summarize("search_by_id", size, timed(engine.search_by_id, lookups, args.rounds)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--ids", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--refresh-repeats", type=int, default=3)
+    parser.add_argument("--out", help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="result file to compare this run against")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # Must be set before src.database is imported; no index bundles or
+    # shard processes, so the runs measure the in-process index
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'catalog.db')}"
+    for name in ("SEARCH_INDEX_PATH", "SEARCH_SHARDS"):
+        os.environ.pop(name, None)
+
+    commit = git_commit()
+    meta = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, args))
+    tmp.cleanup()
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results",
+                                   f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        from .compare import compare, load
+        compare(load(args.compare), {"meta": meta, "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Synthetic multi-store catalog generator for benchmarks.
+
+Produces a DataFrame shaped like the `products` table joined with `stores`
+(the frame `SearchEngine.refresh_index` reads), so the search stack can be
+exercised at any size without a database. Like the real scrapes, stores
+price the same product differently, and Jalal Sons lists a product once per
+branch with a suffix such as "[Gulberg Branch Lahore]" and its own price.
+"""
+
+import numpy as np
+import pandas as pd
+
+STORES = ["Jalal Sons", "Metro Pakistan", "Al-Fatah", "GrocerApp", "Rahim Store", "Green Valley"]
+# Typical price level of each store relative to the others
+STORE_MARKUP = [1.00, 0.94, 1.04, 0.98, 1.06, 1.01]
+
+BRANCHES = ["Gulberg Branch Lahore", "DHA Phase 5 Branch Lahore", "Johar Town Branch Lahore",
+            "Model Town Branch Lahore", "Bahria Town Branch Islamabad", "F-10 Branch Islamabad"]
+
+BRANDS = [
+    "Olpers", "Milkpak", "Nestle", "Nurpur", "Dayfresh", "Shan", "National", "Knorr", "Tapal",
+    "Lipton", "Rafhan", "Youngs", "Mitchells", "Dalda", "Habib", "Sufi", "Dawn", "LU",
+    "Peak Freans", "Surf Excel", "Ariel", "Lux", "Dove", "Lifebuoy", "Colgate", "Kolson",
+]
+
+# (category, product types, unit, typical sizes, base price per size)
+PRODUCT_TYPES = [
+    ("Dairy & Eggs", ["Full Cream Milk", "Low Fat Milk", "Yogurt", "Cheese Slices", "Butter"], "ml", [250, 500, 1000, 1500], 0.3),
+    ("Pantry Essentials", ["Cooking Oil", "Banaspati Ghee", "Chilli Powder", "Biryani Masala", "Basmati Rice"], "g", [50, 100, 500, 1000, 5000], 0.5),
+    ("Beverages", ["Black Tea", "Green Tea", "Mango Juice", "Soft Drink", "Mineral Water"], "ml", [250, 500, 1000, 1500], 0.2),
+    ("Snacks & Sweets", ["Chocolate Biscuit", "Cream Wafer", "Salted Chips", "Custard Powder"], "g", [30, 80, 150, 300], 1.0),
+    ("Household & Personal Care", ["Washing Powder", "Beauty Soap", "Toothpaste", "Shampoo"], "g", [100, 500, 1000], 0.8),
+]
+
+VARIANTS = ["", "", "Family Pack", "Value Pack", "Original", "Classic", "Premium", "New"]
+
+
+def make_catalog(n_rows: int, seed: int = 42, branch_share: float = 0.3) -> pd.DataFrame:
+    """
+    Generate `n_rows` synthetic products spread across all stores. About
+    `branch_share` of the Jalal Sons rows are branch listings of another
+    Jalal Sons product.
+    """
+    rng = np.random.default_rng(seed)
+    jalal_sons = STORES.index("Jalal Sons")
+
+    store_idx = rng.integers(0, len(STORES), n_rows)
+    brand_idx = rng.integers(0, len(BRANDS), n_rows)
+    type_idx = rng.integers(0, len(PRODUCT_TYPES), n_rows)
+    variant_idx = rng.integers(0, len(VARIANTS), n_rows)
+    pick = rng.random(n_rows)
+    noise = rng.normal(1.0, 0.08, n_rows)
+    branch_pick = rng.random(n_rows)
+    branch_idx = rng.integers(0, len(BRANCHES), n_rows)
+    branch_noise = rng.normal(1.0, 0.03, n_rows)
+
+    names, brands, categories, units, quantities, prices = [], [], [], [], [], []
+    last_jalal = None
+    for i in range(n_rows):
+        if store_idx[i] == jalal_sons:
+            if last_jalal is not None and branch_pick[i] < branch_share:
+                # The previous Jalal Sons product again, at another branch
+                j = last_jalal
+                names.append(f"{names[j].split(' [')[0]} [{BRANCHES[branch_idx[i]]}]")
+                brands.append(brands[j])
+                categories.append(categories[j])
+                units.append(units[j])
+                quantities.append(quantities[j])
+                prices.append(round(max(prices[j] * branch_noise[i], 20.0)))
+                continue
+            last_jalal = i
+
+        category, kinds, unit, sizes, per_unit = PRODUCT_TYPES[type_idx[i]]
+        kind = kinds[int(pick[i] * len(kinds))]
+        size = sizes[int(pick[i] * 7919) % len(sizes)]
+        brand = BRANDS[brand_idx[i]]
+        variant = VARIANTS[variant_idx[i]]
+
+        names.append(" ".join(p for p in (brand, kind, variant, f"{size}{unit}") if p))
+        brands.append(brand)
+        categories.append(category)
+        units.append(unit)
+        quantities.append(float(size))
+        prices.append(round(max(size * per_unit * STORE_MARKUP[store_idx[i]] * noise[i], 20.0)))
+
+    prices = np.array(prices, dtype=float)
+    discounted = np.where(rng.random(n_rows) < 0.2, np.round(prices * 0.9), np.nan)
+
+    return pd.DataFrame({
+        "id": np.arange(1, n_rows + 1),
+        "name": names,
+        "brand": brands,
+        "category": categories,
+        "subcategory": None,
+        "price": prices,
+        "discounted_price": discounted,
+        "unit": units,
+        "quantity": quantities,
+        "standardized_weight": quantities,
+        "url": [f"https://example.pk/p/{i}" for i in range(1, n_rows + 1)],
+        "image_url": None,
+        "store_id": store_idx + 1,
+        "store_name": [STORES[s] for s in store_idx],
+    })
+
+
+def make_queries(catalog: pd.DataFrame, n_queries: int, seed: int = 7) -> list:
+    """Sample realistic queries: full names, brand + type, and single words."""
+    rng = np.random.default_rng(seed)
+    names = catalog["name"].to_numpy()
+    queries = []
+    for i in range(n_queries):
+        words = names[rng.integers(0, len(names))].split()
+        style = i % 3
+        if style == 0:
+            queries.append(" ".join(words))
+        elif style == 1:
+            queries.append(" ".join(words[:3]))
+        else:
+            queries.append(words[int(rng.integers(0, len(words)))])
+    return queries
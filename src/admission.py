@@ -0,0 +1,110 @@
+import asyncio
+import os
+from collections import deque
+
+
+class QueueFull(Exception):
+    """The endpoint's wait queue is full."""
+
+
+class QueueTimeout(Exception):
+    """The request waited its whole timeout without getting a slot."""
+
+
+class Limiter:
+    """
+    At most `limit` concurrent requests for one endpoint, plus up to
+    `queue` waiting in arrival order for at most `timeout` seconds.
+
+    Runs on the event loop: acquire() and release() must be called from
+    coroutines of the same loop.
+    """
+
+    def __init__(self, limit: int, queue: int, timeout: float):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self.admitted = self.queued = self.rejected = self.timeouts = 0
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue:
+            self.rejected += 1
+            raise QueueFull()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise QueueTimeout()
+            raise
+        self.admitted += 1
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+class Admission:
+    """One Limiter per endpoint name."""
+
+    def __init__(self, limits: dict, timeout: float = 1.0):
+        self.limiters = {name: Limiter(limit, queue, timeout) for name, (limit, queue) in limits.items()}
+
+    async def acquire(self, name: str):
+        await self.limiters[name].acquire()
+
+    def release(self, name: str):
+        self.limiters[name].release()
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+def admission_from_env(defaults: dict, prefix: str = "SEARCH_ADMIT") -> Admission:
+    """
+    `defaults` maps endpoint names to (limit, queue). <prefix>_<NAME> set
+    to "limit:queue" overrides one; <prefix>_TIMEOUT_MS is the longest a
+    request waits in a queue.
+    """
+    limits = {}
+    for name, (limit, queue) in defaults.items():
+        value = os.getenv(f"{prefix}_{name.upper()}")
+        if value:
+            limit, queue = (int(part) for part in value.split(":"))
+        limits[name] = (limit, queue)
+    return Admission(limits, timeout=float(os.getenv(f"{prefix}_TIMEOUT_MS", "1000")) / 1000)
@@ -1,14 +1,35 @@
-from fastapi import FastAPI, HTTPException, Query
+import hmac
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Annotated, Dict, List, Optional
+from pydantic import BaseModel, Field, TypeAdapter
 from .search import search_engine
 from .recommender import recommender
 from .ranking import ranker
 from .database import SessionLocal
 from .models import Product, Store
+from .cache import cache_from_env, make_key
+from .singleflight import SingleFlight
+from .admission import QueueFull, QueueTimeout, admission_from_env
+from .metrics import metrics, render_gauges
+from .profiling import list_profiles, profile, profile_file
+from .executor import Cancelled, CancelToken, ClientDisconnected, DeadlineExceeded, Overloaded, executor_from_env
 
-app = FastAPI(title="Smart Price Recommender API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Map or build the search index. In the background by default, so the
+    # server answers probes meanwhile; SEARCH_WARMUP=blocking finishes it
+    # before accepting requests.
+    if os.getenv("SEARCH_WARMUP", "background") == "blocking":
+        search_engine.warm_up()
+    else:
+        search_engine.start_warm_up()
+    yield
+
+app = FastAPI(title="Smart Price Recommender API", lifespan=lifespan)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -19,8 +40,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Caching for search queries (Simple in-memory cache)
-query_cache = {}
+# Result cache holding serialized JSON responses, keyed on the normalized
+# query and dropped whenever the search index version changes. Set
+# SEARCH_CACHE_PATH to share it between uvicorn workers.
+result_cache = cache_from_env()
+
+# Concurrent misses for the same key share one computation, awaited on the
+# event loop
+in_flight = SingleFlight()
+
+# Search, ranking and recommendation scoring run on a bounded pool instead of
+# Starlette's unbounded default threadpool. SEARCH_EXECUTOR_WORKERS and
+# SEARCH_EXECUTOR_QUEUE size it; SEARCH_DEADLINE_MS (0 = none) caps how long
+# a request may wait for its result.
+cpu_executor = executor_from_env()
+DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS", "2000"))
+
+# Per-endpoint (concurrent, queued) limits on work sent to the executor, so
+# a burst on one expensive endpoint cannot take the whole pool. Cache hits
+# are answered before admission and never wait. Override one with
+# SEARCH_ADMIT_<ENDPOINT>="limit:queue".
+admission = admission_from_env({
+    "search": (8, 64),
+    "search_batch": (2, 8),
+    "compare": (2, 16),
+    "product": (8, 64),
+    "recommend": (4, 32),
+    "recommend_batch": (2, 8),
+})
 
 class StorePrice(BaseModel):
     store_name: str
@@ -45,44 +92,249 @@ class ProductResponse(BaseModel):
     recommendation_reasons: Optional[str] = None
     all_prices: Optional[List[StorePrice]] = None
 
+PRODUCT_LIST = TypeAdapter(List[ProductResponse])
+PRODUCT = TypeAdapter(ProductResponse)
+PRODUCT_LISTS_BY_ID = TypeAdapter(Dict[int, List[ProductResponse]])
+
+def to_json(adapter: TypeAdapter, payload) -> bytes:
+    # Same validation and output FastAPI applies to response_model
+    return adapter.dump_json(adapter.validate_python(payload))
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+async def run_cpu(request: Request, endpoint: str, fn):
+    """
+    Await `fn(token)` on the CPU executor, once admitted for `endpoint`.
+    A full endpoint queue gives a 429; a queue wait timeout, busy pool or
+    missed deadline a 503. A client that disconnects gets its work
+    cancelled.
+    """
+    if wants_profile(request):
+        fn = profiled(f"{endpoint} {request.url.path} {request.url.query}", fn)
+
+    try:
+        await admission.acquire(endpoint)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "1"})
+    except QueueTimeout:
+        raise HTTPException(status_code=503, detail="Server is busy", headers={"Retry-After": "1"})
+
+    deadline = time.monotonic() + DEADLINE_MS / 1000 if DEADLINE_MS > 0 else None
+    token = CancelToken(deadline)
+    try:
+        return await cpu_executor.run(lambda: fn(token), token, request.is_disconnected)
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server is busy", headers={"Retry-After": "1"})
+    except (DeadlineExceeded, Cancelled):
+        raise HTTPException(status_code=503, detail="Request deadline exceeded", headers={"Retry-After": "1"})
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        admission.release(endpoint)
+
+async def cached_json(request: Request, endpoint: str, key, compute) -> Optional[bytes]:
+    """
+    Response body for `key` from the result cache, or from
+    `compute(token, snap)` on the CPU executor on a miss. compute returns
+    the serialized body, or None for a result that should not be cached.
+    The body is computed on, and cached under the version of, the snapshot
+    served when the request arrived.
+    """
+    snap = search_engine.snapshot
+    version = snap.version
+
+    def fill(token):
+        body = compute(token, snap)
+        if body is not None:
+            result_cache.put(key, body, version)
+        return body
+
+    if wants_profile(request):
+        # A profiled request always computes, and on its own
+        return await run_cpu(request, endpoint, fill)
+    cached = result_cache.get(key, version)
+    if cached is not None:
+        return cached
+
+    # Identical misses are coalesced here, before admission, so requests
+    # waiting for another one's result hold no admission slot or thread
+    while True:
+        try:
+            return await in_flight.do_async((key, version), lambda: run_cpu(request, endpoint, fill))
+        except HTTPException as e:
+            # Raise if this request went away; otherwise the request
+            # computing for us did, so compute it ourselves
+            if e.status_code != 499 or await request.is_disconnected():
+                raise
+
+class BatchSearchRequest(BaseModel):
+    queries: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, max_length=100)
+
+class BatchRecommendRequest(BaseModel):
+    product_ids: List[int] = Field(..., min_length=1, max_length=100)
+    top_n: int = Field(6, ge=1, le=50)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin endpoints are off unless ADMIN_TOKEN is set
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def wants_profile(request: Request) -> bool:
+    # X-Profile: 1 with a valid X-Admin-Token profiles the request's work
+    if request.headers.get("x-profile", "0") in ("", "0"):
+        return False
+    require_admin(request.headers.get("x-admin-token"))
+    return True
+
+def profiled(label: str, fn):
+    def run(token):
+        with profile(label):
+            return fn(token)
+    return run
+
+def require_index():
+    if search_engine.snapshot is None:
+        raise HTTPException(status_code=503, detail="Search index is warming up", headers={"Retry-After": "5"})
+
 @app.get("/")
-def health_check():
-    return {"status": "up", "database": "connected"}
+@app.get("/health/live")
+def liveness():
+    # The process is up and serving; says nothing about the index or the DB
+    return {"status": "alive"}
 
-@app.get("/search", response_model=List[ProductResponse])
-def search_products(query: str = Query(..., min_length=1)):
+@app.get("/health/ready")
+def readiness(response: Response):
+    # 200 once a search index is being served, 503 while warming up
+    health = search_engine.health()
+    if not health["ready"]:
+        response.status_code = 503
+    return health
+
+@app.get("/stats")
+def get_stats():
+    # Counters for monitoring
+    return {
+        "index_version": search_engine.index_version,
+        "result_cache": result_cache.stats(),
+        "single_flight": in_flight.stats(),
+        "executor": cpu_executor.stats(),
+        "admission": admission.stats(),
+        "shards": search_engine.shards.stats() if search_engine.shards else None,
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text format: per-stage latency histograms plus the /stats counters
+    cache = result_cache.stats()
+    body = "".join([
+        metrics.render(),
+        render_gauges("search_result_cache", "Result cache statistics.", cache, label="tier"),
+        render_gauges("search_single_flight", "Coalesced computation statistics.", in_flight.stats()),
+        render_gauges("search_executor", "CPU executor statistics.", cpu_executor.stats()),
+        render_gauges("search_admission", "Admission control statistics.", admission.stats(), label="endpoint"),
+    ])
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/reindex", status_code=202, dependencies=[Depends(require_admin)])
+def trigger_reindex(profile: bool = False):
+    # Builds a new index snapshot in the background; requests keep being
+    # served from the current one until it is swapped in. ?profile=true
+    # profiles the build into SEARCH_PROFILE_DIR.
+    started = search_engine.start_refresh(profile=profile)
+    return {"started": started, "status": search_engine.refresh_status()}
+
+@app.get("/admin/reindex", dependencies=[Depends(require_admin)])
+def reindex_status():
+    return search_engine.refresh_status()
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def get_profiles():
+    # Profiles of requests sent with X-Profile and of profiled builds, newest first
+    return list_profiles()
+
+@app.get("/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+def get_profile_file(name: str):
+    path = profile_file(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path, "rb") as f:
+        return Response(content=f.read(), media_type="text/plain")
+
+@app.get("/search", response_model=List[ProductResponse], dependencies=[Depends(require_index)])
+async def search_products(request: Request, query: str = Query(..., min_length=1)):
     try:
-        # Check cache
-        if query in query_cache:
-            return query_cache[query]
+        def compute(token, snap):
+            results = search_engine.search(query, snapshot=snap)
+            if not results:
+                return None
+            
+            # Apply ranking
+            token.check()
+            with metrics.timer("search", "ranking"):
+                ranked_results = ranker.rank_results(results)
+            token.check()
+            with metrics.timer("search", "serialization"):
+                return to_json(PRODUCT_LIST, ranked_results)
         
-        results = search_engine.search(query)
-        if not results:
+        body = await cached_json(request, "search", make_key("search", query, top_n=20), compute)
+        if body is None:
             return []
+        return json_response(body)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search/batch", response_model=List[List[ProductResponse]], dependencies=[Depends(require_index)])
+async def search_products_batch(batch: BatchSearchRequest, request: Request):
+    try:
+        queries = batch.queries
+        keys = [make_key("search", q, top_n=20) for q in queries]
+        snap = search_engine.snapshot
+        version = snap.version
+        responses = [result_cache.get(key, version) for key in keys]
         
-        # Apply ranking
-        ranked_results = ranker.rank_results(results)
+        # Vectorize and score all uncached queries together
+        missing = [i for i, cached in enumerate(responses) if cached is None]
         
-        # Limit cache size
-        if len(query_cache) > 100:
-            query_cache.pop(next(iter(query_cache)))
-            
-        query_cache[query] = ranked_results
-        return ranked_results
+        def compute(token):
+            batch_results = search_engine.search_many([queries[i] for i in missing], snapshot=snap)
+            for i, results in zip(missing, batch_results):
+                token.check()
+                if not results:
+                    responses[i] = b"[]"
+                    continue
+                with metrics.timer("search_batch", "ranking"):
+                    ranked_results = ranker.rank_results(results)
+                with metrics.timer("search_batch", "serialization"):
+                    responses[i] = to_json(PRODUCT_LIST, ranked_results)
+                result_cache.put(keys[i], responses[i], version)
+        
+        if missing:
+            await run_cpu(request, "search_batch", compute)
+        return json_response(b"[" + b",".join(responses) + b"]")
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/compare/{product_id}")
-def compare_prices(product_id: int):
+@app.get("/compare/{product_id}", dependencies=[Depends(require_index)])
+async def compare_prices(product_id: int, request: Request):
     results = search_engine.search_by_id(product_id) # Need to implement this helper
     if not results:
         raise HTTPException(status_code=404, detail="Product not found")
         
     # Logic to find same product in other stores
     # (Simplified: search for the exact product name in the engine)
-    matches = search_engine.search(results['name'], top_n=50)
+    matches = await run_cpu(request, "compare", lambda token: search_engine.search(results['name'], top_n=50))
     
     comparison = {
         "target": results,
@@ -96,29 +348,42 @@ def compare_prices(product_id: int):
     
     return comparison
 
-@app.get("/product/{product_id}", response_model=ProductResponse)
-def get_product_details(product_id: int):
-    # Get the raw product
-    raw_product = search_engine.search_by_id(product_id)
-    if not raw_product:
-        raise HTTPException(status_code=404, detail="Product not found")
+@app.get("/product/{product_id}", response_model=ProductResponse, dependencies=[Depends(require_index)])
+async def get_product_details(product_id: int, request: Request):
+    def compute(token, snap):
+        # The product with all its store prices, straight from the group index
+        product = search_engine.product_group(product_id, snapshot=snap)
+        return to_json(PRODUCT, product) if product else None
     
-    # To get the grouped version (all prices), we can search for the product name
-    # The fuzzy grouping in .search() will consolidate it
-    results = search_engine.search(raw_product['name'], top_n=10)
-    for res in results:
-        if res['id'] == product_id:
-            return res
-            
-    # Fallback to the raw product if grouping didn't catch it for some reason
-    return raw_product
+    body = await cached_json(request, "product", make_key("product", product_id), compute)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return json_response(body)
 
-@app.get("/recommend/{product_id}", response_model=List[ProductResponse])
-def get_recommendations(product_id: int):
-    recs = recommender.recommend(product_id)
-    if not recs:
+@app.get("/recommend/{product_id}", response_model=List[ProductResponse], dependencies=[Depends(require_index)])
+async def get_recommendations(product_id: int, request: Request):
+    def compute(token, snap):
+        recs = recommender.recommend(product_id, snapshot=snap)
+        if not recs:
+            return None
+        with metrics.timer("recommend", "serialization"):
+            return to_json(PRODUCT_LIST, recs)
+    
+    body = await cached_json(request, "recommend", make_key("recommend", product_id, top_n=6), compute)
+    if body is None:
         return []
-    return recs
+    return json_response(body)
+
+@app.post("/recommend/batch", response_model=Dict[int, List[ProductResponse]], dependencies=[Depends(require_index)])
+async def get_batch_recommendations(batch: BatchRecommendRequest, request: Request):
+    # One round trip for a whole product grid; unknown ids map to []
+    def compute(token):
+        recs = recommender.recommend_many(batch.product_ids, top_n=batch.top_n)
+        token.check()
+        with metrics.timer("recommend_batch", "serialization"):
+            return to_json(PRODUCT_LISTS_BY_ID, recs)
+
+    return json_response(await run_cpu(request, "recommend_batch", compute))
 
 @app.get("/stores")
 def get_stores():
@@ -0,0 +1,272 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from .preprocessing import normalize_text
+
+
+def make_key(kind: str, query, **params) -> tuple:
+    """Cache key: endpoint kind, normalized query text and sorted parameters."""
+    if isinstance(query, str):
+        query = normalize_text(query)
+    return (kind, query, *sorted(params.items()))
+
+
+def approx_size(value) -> int:
+    """Rough in-memory size of a cached result in bytes."""
+    if isinstance(value, bytes):
+        return len(value)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(v) for v in value)
+    return size
+
+
+class ResultCache:
+    """
+    Thread-safe LRU result cache.
+
+    Bounded by entry count and approximate bytes, with a per-entry TTL.
+    Every lookup carries the current index version; when it changes, the
+    whole cache is dropped so no result outlives the index it came from.
+    A put for any other version is computed on a replaced index and skipped.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def is_stale(self, version) -> bool:
+        """True once lookups have moved on from `version` to another index."""
+        return self._version is not None and version != self._version
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, version):
+        """Cached value for `key`, or None on a miss."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version):
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self.is_stale(version):
+                return
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            # Evict least recently used entries until within both bounds
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "index_version": self._version,
+            }
+
+
+class SharedCache:
+    """
+    Result cache shared by all worker processes, stored in a SQLite file.
+
+    Values are pre-serialized bytes. Entries carry the index version they
+    were computed against; lookups only match the current version, and
+    stale versions, expired rows and the oldest rows beyond `max_entries`
+    are pruned periodically. Any SQLite error is treated as a miss, so the
+    cache can never fail a request.
+    """
+
+    PRUNE_EVERY = 200
+
+    def __init__(self, path: str, max_entries: int = 20000, ttl: float = 300.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = self.misses = self.errors = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, version TEXT, value BLOB, expires_at REAL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, version):
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM results WHERE key = ? AND version = ? AND expires_at > ?",
+                (json.dumps(key), str(version), time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            self._count_error()
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return bytes(row[0])
+
+    def _count_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def put(self, key, value: bytes, version):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (json.dumps(key), str(version), value, time.time() + self.ttl),
+            )
+            with self._lock:
+                self._puts += 1
+                prune = self._puts % self.PRUNE_EVERY == 0
+            if prune:
+                self._prune(conn, version)
+        except sqlite3.Error:
+            self._count_error()
+
+    def _prune(self, conn, version):
+        conn.execute("DELETE FROM results WHERE version != ? OR expires_at <= ?", (str(version), time.time()))
+        conn.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        try:
+            self._conn().execute("DELETE FROM results")
+        except sqlite3.Error:
+            self._count_error()
+
+    def stats(self) -> dict:
+        try:
+            entries = self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "errors": self.errors,
+            }
+
+
+class TieredCache:
+    """In-process LRU (L1) in front of an optional cross-worker SharedCache (L2)."""
+
+    def __init__(self, local: ResultCache, shared: SharedCache = None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, version):
+        value = self.local.get(key, version)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key, version)
+            if value is not None:
+                self.local.put(key, value, version)
+        return value
+
+    def put(self, key, value, version):
+        # Skip both tiers: pruning the shared one keeps only the put's version
+        if self.local.is_stale(version):
+            return
+        self.local.put(key, value, version)
+        if self.shared is not None:
+            self.shared.put(key, value, version)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def cache_from_env(prefix: str = "SEARCH_CACHE") -> TieredCache:
+    """
+    Result cache configured from the environment.
+
+    <prefix>_MAX_ENTRIES / _MAX_BYTES / _TTL size the in-process LRU;
+    setting <prefix>_PATH to a file adds the SQLite cache shared by workers.
+    """
+    ttl = float(os.getenv(f"{prefix}_TTL", "300"))
+    local = ResultCache(
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "1024")),
+        max_bytes=int(os.getenv(f"{prefix}_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl=ttl,
+    )
+    path = os.getenv(f"{prefix}_PATH")
+    shared = SharedCache(path, max_entries=int(os.getenv(f"{prefix}_SHARED_MAX_ENTRIES", "20000")), ttl=ttl) if path else None
+    return TieredCache(local, shared)
@@ -0,0 +1,120 @@
+import re
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from .preprocessing import clean_product_name
+
+# Minimum token_sort_ratio for two names in the same block to be the same product
+MATCH_THRESHOLD = 85
+
+# Rows per rapidfuzz cdist call, to bound memory on very large blocks
+CHUNK_SIZE = 2000
+
+# Size/unit mentions like "500g", "1.5 Ltr" (already captured by the block key)
+SIZE_PATTERN = re.compile(
+    r'\b\d+(?:\.\d+)?\s*(?:gm|g|gram|gms|grams|kg|kilogram|kilo|ml|milliliter|l|litre|ltr|liter|pcs|piece|pkt|pack|packet|pc)\b'
+)
+
+
+def match_name(name) -> str:
+    """Name used for fuzzy scoring: branch suffix, sizes and filler words removed."""
+    name = str(name).split('[')[0]
+    name = clean_product_name(name)
+    return re.sub(r'\s+', ' ', SIZE_PATTERN.sub(' ', name)).strip()
+
+
+def block_keys(df: pd.DataFrame) -> pd.Series:
+    """Blocking key per row: (brand, unit, standardized weight)."""
+    brand = df['brand'].fillna('').astype(str).str.strip().str.lower()
+    unit = df['unit'].fillna('').astype(str).str.strip().str.lower()
+    # Fall back to the raw quantity when the weight could not be standardized
+    weight = df['standardized_weight'].fillna(df['quantity']).round(3).fillna(-1).astype(str)
+    return brand + '|' + unit + '|' + weight
+
+
+def _block_pairs(names, threshold, workers):
+    """(i, j) pairs of matching names within one block."""
+    rows, cols = [], []
+    for start in range(0, len(names), CHUNK_SIZE):
+        scores = process.cdist(
+            names[start:start + CHUNK_SIZE], names,
+            scorer=fuzz.token_sort_ratio, score_cutoff=threshold,
+            dtype=np.uint8, workers=workers,
+        )
+        i, j = np.nonzero(scores)
+        rows.append(i + start)
+        cols.append(j)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def cluster_products(df: pd.DataFrame, threshold: int = MATCH_THRESHOLD, workers: int = -1) -> np.ndarray:
+    """
+    Offline entity resolution across stores.
+
+    Rows are blocked on brand, unit and standardized weight; names within a
+    block are scored with rapidfuzz (`cdist` runs on `workers` threads, -1 =
+    all cores) and matching pairs are merged into connected components.
+
+    Returns, per row, the smallest `id` of its cluster (the canonical product).
+    """
+    n = len(df)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    names = np.array([match_name(x) for x in df['name']], dtype=object)
+    keys = block_keys(df).to_numpy()
+
+    pair_rows, pair_cols = [], []
+    for members in pd.Series(np.arange(n)).groupby(keys).indices.values():
+        if len(members) < 2:
+            continue
+        i, j = _block_pairs(list(names[members]), threshold, workers)
+        pair_rows.append(members[i])
+        pair_cols.append(members[j])
+
+    if pair_rows:
+        rows, cols = np.concatenate(pair_rows), np.concatenate(pair_cols)
+    else:
+        rows = cols = np.empty(0, dtype=np.int64)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    ids = df['id'].to_numpy()
+    return pd.Series(ids).groupby(labels).transform('min').to_numpy()
+
+
+def assign_canonical_ids(threshold: int = MATCH_THRESHOLD, workers: int = -1):
+    """Cluster every product in the database and store its `canonical_product_id`."""
+    from .database import SessionLocal
+    from .models import Product
+
+    db = SessionLocal()
+    try:
+        query = db.query(
+            Product.id, Product.name, Product.brand, Product.unit,
+            Product.quantity, Product.standardized_weight
+        )
+        df = pd.read_sql(query.statement, db.get_bind())
+        canonical = cluster_products(df, threshold=threshold, workers=workers)
+
+        updates = [
+            {"id": int(pid), "canonical_product_id": int(cid)}
+            for pid, cid in zip(df['id'], canonical)
+        ]
+        # Batch commit every 1000 items
+        for start in range(0, len(updates), 1000):
+            db.bulk_update_mappings(Product, updates[start:start + 1000])
+            db.commit()
+
+        print(f"Clustered {len(df)} products into {len(set(canonical.tolist()))} canonical products.")
+    except Exception as e:
+        print(f"An error occurred during clustering: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    assign_canonical_ids()
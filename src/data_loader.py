@@ -1,14 +1,32 @@
-import pandas as pd
 import os
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
-from .database import SessionLocal, engine, Base
+from .database import SessionLocal, get_engine, Base
 from .models import Store, Product
+from .profiling import maybe_profile
 
 def init_db():
     print("Initializing database tables...")
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
 
-def load_data_to_db(csv_path: str):
+    # create_all does not add columns to existing tables
+    columns = {c['name'] for c in inspect(engine).get_columns('products')}
+    if 'canonical_product_id' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE products ADD COLUMN canonical_product_id INTEGER"))
+            conn.execute(text("CREATE INDEX ix_products_canonical_product_id ON products (canonical_product_id)"))
+
+def load_data_to_db(csv_path: str, profile: bool = False):
+    # With `profile` (or SEARCH_PROFILE_BUILDS=1) the whole ingestion,
+    # clustering included, is profiled into SEARCH_PROFILE_DIR
+    with maybe_profile("load_data_to_db", profile):
+        _load_data_to_db(csv_path)
+
+def _load_data_to_db(csv_path: str):
+    import pandas as pd
+    from .clustering import assign_canonical_ids
+
     if not os.path.exists(csv_path):
         print(f"Error: File {csv_path} not found.")
         return
@@ -61,6 +79,9 @@ def load_data_to_db(csv_path: str):
             db.commit()
             
         print(f"Successfully ingested {len(df)} products into the database.")
+
+        # Offline cross-store matching over the whole catalog
+        assign_canonical_ids()
         
     except Exception as e:
         print(f"An error occurred during ingestion: {e}")
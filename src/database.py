@@ -27,11 +27,31 @@ if raw_url and "://" in raw_url and "@" in raw_url:
 else:
     DATABASE_URL = raw_url
 
-print(f"Connecting to: {DATABASE_URL.split('@')[-1] if '@' in str(DATABASE_URL) else 'Unknown'}")
+_engine = None
+_session_factory = None
 
-# Supabase requires SSL
-engine = create_engine(DATABASE_URL, connect_args={"sslmode": "require"})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_engine():
+    """The SQLAlchemy engine, created on first use rather than at import."""
+    global _engine, _session_factory
+    if _engine is None:
+        print(f"Connecting to: {DATABASE_URL.split('@')[-1] if '@' in str(DATABASE_URL) else 'Unknown'}")
+
+        # Supabase requires SSL; other backends (SQLite for benchmarks) take no sslmode
+        connect_args = {"sslmode": "require"} if str(DATABASE_URL).startswith("postgres") else {}
+        _engine = create_engine(DATABASE_URL, connect_args=connect_args)
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    return _engine
+
+def SessionLocal():
+    """A new session on the lazily created engine."""
+    get_engine()
+    return _session_factory()
+
+def __getattr__(name):
+    # `from .database import engine` keeps working, without connecting at import
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """The executor's queue is full."""
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before its work finished."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its work finished."""
+
+
+class Cancelled(Exception):
+    """Raised inside work whose request was cancelled or timed out."""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for one request's work.
+
+    Threads cannot be interrupted, so work calls `check()` between its
+    stages and stops there once the request is cancelled or past its
+    deadline.
+    """
+
+    def __init__(self, deadline: float = None):
+        self.deadline = deadline  # time.monotonic() value, or None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> float:
+        return float("inf") if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+
+    def check(self):
+        if self.cancelled or self.expired():
+            raise Cancelled()
+
+
+class CPUExecutor:
+    """
+    Bounded thread pool for CPU-heavy request work.
+
+    At most `max_pending` jobs are queued or running; beyond that submit()
+    raises Overloaded instead of letting the queue grow. NumPy/SciPy release
+    the GIL in the heavy sparse kernels, so threads overlap those.
+    """
+
+    # Seconds between checks for a disconnected client
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, workers: int = None, max_pending: int = 64):
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = self.rejected = self.timeouts = self.disconnects = 0
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+        self._slots.release()
+
+    def submit(self, fn):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+        with self._lock:
+            self.pending += 1
+        future = self._pool.submit(fn)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, token: CancelToken, is_disconnected=None):
+        """
+        Run fn() on the pool and await its result.
+
+        Raises DeadlineExceeded when `token` expires first, and
+        ClientDisconnected when the `is_disconnected` coroutine function
+        reports the client gone. In both cases the token is cancelled and
+        a job that has not started yet is dropped from the queue.
+        """
+        waiter = asyncio.wrap_future(self.submit(fn))
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=min(self.POLL_INTERVAL, token.remaining()))
+                if done:
+                    return waiter.result()
+                if token.expired():
+                    with self._lock:
+                        self.timeouts += 1
+                    raise DeadlineExceeded()
+                if is_disconnected is not None and await is_disconnected():
+                    with self._lock:
+                        self.disconnects += 1
+                    raise ClientDisconnected()
+        finally:
+            if not waiter.done():
+                token.cancel()
+                waiter.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "disconnects": self.disconnects,
+            }
+
+
+def executor_from_env(prefix: str = "SEARCH_EXECUTOR") -> CPUExecutor:
+    """<prefix>_WORKERS threads (default: CPU count), at most <prefix>_QUEUE jobs queued or running."""
+    workers = os.getenv(f"{prefix}_WORKERS")
+    return CPUExecutor(
+        workers=int(workers) if workers else None,
+        max_pending=int(os.getenv(f"{prefix}_QUEUE", "64")),
+    )
@@ -0,0 +1,187 @@
+import math
+import numpy as np
+import pandas as pd
+from .product_store import MATCH_UNITS
+
+# Two quantities are "the same" when they differ by less than this
+QTY_TOLERANCE = 0.001
+
+
+def _qty_bucket(qty: float) -> int:
+    # Buckets are twice as wide as the tolerance, so a matching group is
+    # always in the candidate's bucket or one of its two neighbours.
+    return math.floor(qty / (2 * QTY_TOLERANCE))
+
+
+def _block_members(blocks: dict, key: tuple, bucket: int):
+    """Group indices for `key` in the three buckets around `bucket`, oldest first."""
+    here = blocks.get((*key, bucket), ())
+    below = blocks.get((*key, bucket - 1))
+    above = blocks.get((*key, bucket + 1))
+    if below is None and above is None:
+        return here
+    return sorted([*here, *(below or ()), *(above or ())])
+
+
+def _add_price(group: dict, store_map: dict, store_info: dict, score: float):
+    # Handle branch duplicates: only keep the lowest price per store
+    existing = store_map.get(store_info['store_name'])
+    if existing is not None:
+        if store_info['price'] < existing['price']:
+            existing.update(store_info)
+    else:
+        group['all_prices'].append(store_info)
+        store_map[store_info['store_name']] = store_info
+
+    group['min_price'] = min(group['min_price'], store_info['price'])
+    if score > group['similarity_score']:
+        group['similarity_score'] = score
+
+
+def group_candidates(store, candidates):
+    """
+    Fuzzy-group search candidates into one entry per product across stores.
+
+    `candidates` are (row position, similarity score) pairs, best first. A
+    candidate joins the oldest group with the same unit and quantity that
+    either has the same non-empty brand and shares a name token, or sits in a
+    0.6-1.6x price window with more than 60% token overlap; otherwise it
+    starts a new group.
+
+    Groups are hash-blocked by (unit, rounded qty) and (unit, rounded qty,
+    brand), and each group keeps a store -> price entry map, so a candidate
+    is only compared with groups it could actually join.
+    """
+    final_groups = []
+    store_maps = []
+    unit_blocks = {}   # (unit, qty bucket) -> group indices
+    brand_blocks = {}  # (unit, brand, qty bucket) -> group indices
+
+    # Gather the candidates' precomputed features in one pass over the arrays
+    positions = [idx for idx, _ in candidates]
+    qtys = store.match_qty[positions].tolist()
+    units = [MATCH_UNITS[c] for c in store.match_unit_codes[positions].tolist()]
+    brands = [store.brands_lower[c] if c >= 0 else "" for c in store.brand_codes[positions].tolist()]
+    store_names = [store.store_names[c] if c >= 0 else None for c in store.store_codes[positions].tolist()]
+    prices = store.price[positions].tolist()
+    discounted_prices = store.discounted_price[positions].tolist()
+
+    for i, (idx, score) in enumerate(candidates):
+        qty, unit, brand = qtys[i], units[i], brands[i]
+        tokens = store.name_tokens[idx]
+        bucket = _qty_bucket(qty)
+
+        price = prices[i] if prices[i] == prices[i] else 0.0
+        discounted_price = discounted_prices[i]
+
+        store_info = {
+            "store_name": store_names[i],
+            "price": price,
+            "url": store.urls[idx],
+            "discounted_price": discounted_price if discounted_price == discounted_price else None
+        }
+
+        match = None
+
+        # 1. Exact brand match + same unit = Highly likely same product
+        # Even if name differs slightly (e.g. 'Milkpak' vs 'Milkpak Full Cream')
+        if brand != "":
+            for gi in _block_members(brand_blocks, (unit, brand), bucket):
+                group = final_groups[gi]
+                if abs(group['qty'] - qty) < QTY_TOLERANCE and not tokens.isdisjoint(group['tokens']):
+                    match = gi
+                    break
+
+        # 2. No brand match / generic: Check price window and high token overlap.
+        # An older group matching this way wins over a later brand match.
+        for gi in _block_members(unit_blocks, (unit,), bucket):
+            if match is not None and gi >= match:
+                break
+            group = final_groups[gi]
+            if abs(group['qty'] - qty) >= QTY_TOLERANCE:
+                continue
+            if group['min_price'] > 0 and (0.6 <= (price / group['min_price']) <= 1.6):
+                overlap = len(tokens.intersection(group['tokens'])) / max(len(tokens), len(group['tokens']))
+                if overlap > 0.6:
+                    match = gi
+                    break
+
+        if match is not None:
+            _add_price(final_groups[match], store_maps[match], store_info, score)
+            continue
+
+        product = store.record(idx)
+        product['name'] = store.base_names[idx]
+        product['similarity_score'] = score
+        product['all_prices'] = [store_info]
+
+        gi = len(final_groups)
+        final_groups.append({
+            **product,
+            "tokens": tokens,
+            "brand": brand,
+            "unit": unit,
+            "qty": qty,
+            "min_price": price
+        })
+        store_maps.append({store_info['store_name']: store_info})
+        unit_blocks.setdefault((unit, bucket), []).append(gi)
+        if brand != "":
+            brand_blocks.setdefault((unit, brand, bucket), []).append(gi)
+
+    # Sort prices within each group and clean up metadata
+    for g in final_groups:
+        g['all_prices'] = sorted(g['all_prices'], key=lambda x: x['price'])
+        for key in ['tokens', 'min_price', 'qty']:
+            g.pop(key, None)
+
+    return final_groups
+
+
+class ProductGroups:
+    """
+    Product -> cross-store group index, built at index time.
+
+    Groups are the offline `canonical_product_id` clusters. Members of each
+    group are stored as CSR-style arrays sorted by price, so the group of any
+    row position is two array lookups away.
+    """
+
+    def __init__(self, store, canonical_ids):
+        codes, _ = pd.factorize(canonical_ids)
+        prices = np.nan_to_num(store.price, nan=0.0)
+        order = np.lexsort((prices, codes))
+
+        self.store = store
+        self.group_of = codes.astype(np.int32)
+        self.members = order.astype(np.int32)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=codes.max(initial=-1) + 1))])
+
+    @classmethod
+    def from_arrays(cls, store, group_of, members, indptr):
+        """An index over previously computed (e.g. memory-mapped) arrays."""
+        groups = cls.__new__(cls)
+        groups.store, groups.group_of, groups.members, groups.indptr = store, group_of, members, indptr
+        return groups
+
+    def group_positions(self, pos: int) -> np.ndarray:
+        """Row positions in the same group as `pos`, cheapest first."""
+        g = self.group_of[pos]
+        return self.members[self.indptr[g]:self.indptr[g + 1]]
+
+    def group(self, pos: int) -> dict:
+        """The product at `pos` in the grouped response shape used by search()."""
+        store = self.store
+        all_prices = {}
+        for member in self.group_positions(pos).tolist():
+            # Members are sorted by price, so the first entry per store is the
+            # cheapest branch
+            entry = store.price_entry(member)
+            all_prices.setdefault(entry['store_name'], entry)
+
+        product = store.record(pos)
+        product['name'] = store.base_names[pos]
+        product['brand'] = store.brand_lower(pos)
+        product['unit'] = store.match_unit(pos)
+        product['all_prices'] = sorted(all_prices.values(), key=lambda x: x['price'])
+        return product
@@ -0,0 +1,341 @@
+"""
+Persisted search index snapshots, shared by all worker processes.
+
+A bundle is a directory named after the index version holding one .npy
+file per array plus a manifest.json: the TF-IDF vocabulary and IDF weights,
+the CSR arrays of the TF-IDF matrix, inverted index and neighbour scoring
+inputs, the product store columns, the group index and the neighbour table.
+Strings are stored as one UTF-8 blob plus byte offsets.
+
+Workers memory-map a bundle read-only instead of building their own index,
+so every worker shares the same page-cache pages: large string columns are
+decoded per access and id lookups binary-search a sorted array, leaving
+only small vocabularies in each process. The builder publishes a bundle by
+atomically replacing the CURRENT file in the bundle root; workers poll it
+and switch snapshots when it changes.
+
+    python -m src.index_bundle --out index/
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .grouping import ProductGroups
+from .neighbors import NeighborTable, truncate_rows
+from .product_store import ARRAY_FIELDS, STRING_FIELDS, ProductStore
+from .snapshot import VECTORIZER_PARAMS, IndexSnapshot, build_snapshot, load_products_df
+
+FORMAT = 2
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+
+# Bundles kept in the root besides the current one, for workers that have
+# not switched yet (deleting a mapped file is safe on POSIX anyway)
+KEEP_BUNDLES = 3
+
+# Store string lists small enough to decode into every worker
+SMALL_STRING_FIELDS = ['store_names', 'brands', 'units', 'brands_lower']
+
+
+class StringColumn(Sequence):
+    """Read-only list of strings decoded on access from a UTF-8 blob."""
+
+    def __init__(self, chars, offsets, missing):
+        self.chars, self.offsets, self.missing = chars, offsets, missing
+
+    def __len__(self):
+        return len(self.missing)
+
+    def __getitem__(self, pos):
+        if self.missing[pos]:
+            return None
+        return self.chars[self.offsets[pos]:self.offsets[pos + 1]].tobytes().decode("utf-8")
+
+
+class TokenColumn(StringColumn):
+    """Name tokens stored space-separated, returned as frozensets."""
+
+    def __getitem__(self, pos):
+        return frozenset(super().__getitem__(pos).split())
+
+
+class DatetimeColumn(Sequence):
+    """datetime64 array returning Timestamps, or None for NaT."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, pos):
+        import pandas as pd
+
+        value = self.values[pos]
+        return None if np.isnat(value) else pd.Timestamp(value)
+
+
+class IdIndex:
+    """Product id -> row position by binary search over the sorted ids."""
+
+    def __init__(self, sorted_ids, order):
+        self.sorted_ids, self.order = sorted_ids, order
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def get(self, product_id, default=None):
+        i = int(np.searchsorted(self.sorted_ids, product_id))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == product_id:
+            return int(self.order[i])
+        return default
+
+
+def _save_array(directory, name, array):
+    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+
+def _load_array(directory, name):
+    # A plain ndarray view of the read-only mapping: slicing np.memmap
+    # objects is much slower on the per-row access paths
+    return np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False))
+
+
+def _save_strings(directory, name, values):
+    encoded = [v.encode("utf-8") if v is not None else b"" for v in values]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    _save_array(directory, f"{name}.chars", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    _save_array(directory, f"{name}.offsets", np.concatenate([[0], np.cumsum(lengths)]))
+    _save_array(directory, f"{name}.missing", np.array([v is None for v in values], dtype=bool))
+
+
+def _load_strings(directory, name, column=StringColumn):
+    return column(*(_load_array(directory, f"{name}.{part}") for part in ("chars", "offsets", "missing")))
+
+
+def _save_csr(directory, name, matrix):
+    for part in ("data", "indices", "indptr"):
+        _save_array(directory, f"{name}.{part}", getattr(matrix, part))
+    return list(matrix.shape)
+
+
+def _load_csr(directory, name, shape):
+    parts = [_load_array(directory, f"{name}.{part}") for part in ("data", "indices", "indptr")]
+    return csr_matrix(tuple(parts), shape=tuple(shape), copy=False)
+
+
+def _save_columns(directory, columns):
+    """Response columns of the product store; returns their manifest entries."""
+    kinds = []
+    for i, (col, values) in enumerate(columns):
+        name = f"column{i}"
+        if isinstance(values, np.ndarray):
+            kind = "array"
+            _save_array(directory, name, values)
+        elif all(v is None or isinstance(v, str) for v in values):
+            kind = "strings"
+            _save_strings(directory, name, values)
+        elif all(v is None or hasattr(v, "isoformat") for v in values):
+            # Timestamps (e.g. last_updated), stored as datetime64[ns]
+            kind = "datetime"
+            _save_array(directory, name, np.array(values, dtype="datetime64[ns]"))
+        else:
+            raise TypeError(f"Cannot persist column {col!r}")
+        kinds.append([col, kind])
+    return kinds
+
+
+def _load_columns(directory, kinds):
+    columns = []
+    for i, (col, kind) in enumerate(kinds):
+        name = f"column{i}"
+        if kind == "array":
+            values = _load_array(directory, name)
+        elif kind == "strings":
+            values = _load_strings(directory, name)
+        else:
+            values = DatetimeColumn(_load_array(directory, name))
+        columns.append((col, values))
+    return columns
+
+
+def save_bundle(snapshot: IndexSnapshot, root: str) -> str:
+    """
+    Write `snapshot` to `root/<version>/`, publish it as CURRENT and return
+    its path.
+
+    The bundle is written to a temporary directory and renamed into place,
+    so readers never see a partial bundle. An existing bundle for the same
+    version is kept as is.
+    """
+    path = os.path.join(root, snapshot.version)
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        _write_bundle(snapshot, root, path)
+    publish_bundle(root, snapshot.version)
+    return path
+
+
+def _write_bundle(snapshot, root, path):
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{snapshot.version}.", dir=root)
+    try:
+        vectorizer = snapshot.vectorizer
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, column in vectorizer.vocabulary_.items():
+            terms[column] = term
+        _save_strings(tmp, "vocabulary", terms)
+        _save_array(tmp, "idf", vectorizer.idf_)
+
+        store = snapshot.product_store
+        for field in ARRAY_FIELDS:
+            _save_array(tmp, f"store.{field}", getattr(store, field))
+        for field in STRING_FIELDS:
+            _save_strings(tmp, f"store.{field}", getattr(store, field))
+        _save_strings(tmp, "store.name_tokens", [" ".join(sorted(t)) for t in store.name_tokens])
+        order = np.argsort(store.ids, kind="stable")
+        _save_array(tmp, "store.id_order", order)
+        _save_array(tmp, "store.sorted_ids", np.asarray(store.ids)[order])
+
+        groups = snapshot.product_groups
+        for field in ("group_of", "members", "indptr"):
+            _save_array(tmp, f"groups.{field}", getattr(groups, field))
+
+        neighbors = snapshot.neighbors
+        for field in ("positions", "scores", "similarities", "flags"):
+            _save_array(tmp, f"neighbors.{field}", getattr(neighbors, field))
+        # Inputs for scoring recommendations beyond the table's k
+        inverted_index = snapshot.inverted_index
+        product_vectors = inverted_index.T.tocsr()
+        candidate_index = truncate_rows(inverted_index, neighbors.max_postings)
+
+        manifest = {
+            "format": FORMAT,
+            "version": snapshot.version,
+            "created_at": time.time(),
+            "products": store.size,
+            "vectorizer": {name: snapshot.vectorizer.get_params()[name] for name in VECTORIZER_PARAMS}
+                          | {"ngram_range": list(snapshot.vectorizer.ngram_range)},
+            "tfidf_matrix": _save_csr(tmp, "tfidf_matrix", snapshot.tfidf_matrix),
+            "inverted_index": _save_csr(tmp, "inverted_index", snapshot.inverted_index),
+            "neighbors": {"max_postings": neighbors.max_postings, "query_terms": neighbors.query_terms},
+            "product_vectors": _save_csr(tmp, "product_vectors", product_vectors),
+            "candidate_index": _save_csr(tmp, "candidate_index", candidate_index),
+            "columns": _save_columns(tmp, store.columns),
+        }
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Another process may have published the same version first
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            raise
+
+
+def publish_bundle(root: str, version: str):
+    """Atomically point CURRENT at a bundle and prune old bundles."""
+    fd, tmp = tempfile.mkstemp(prefix=".CURRENT.", dir=root)
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+    bundles = []
+    for entry in os.listdir(root):
+        manifest = os.path.join(root, entry, MANIFEST)
+        if entry != version and not entry.startswith(".") and os.path.exists(manifest):
+            bundles.append((os.path.getmtime(manifest), entry))
+    for _, entry in sorted(bundles)[:-KEEP_BUNDLES or None]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def find_bundle(path: str):
+    """
+    The bundle at `path`, or the one CURRENT points to in a bundle root
+    (the newest bundle if there is no CURRENT); None if there is none.
+    """
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path
+    try:
+        with open(os.path.join(path, CURRENT)) as f:
+            current = os.path.join(path, f.read().strip())
+        if os.path.exists(os.path.join(current, MANIFEST)):
+            return current
+    except FileNotFoundError:
+        pass
+
+    newest, newest_time = None, None
+    if os.path.isdir(path):
+        for entry in os.listdir(path):
+            manifest = os.path.join(path, entry, MANIFEST)
+            if entry.startswith(".") or not os.path.exists(manifest):
+                continue
+            with open(manifest) as f:
+                created_at = json.load(f)["created_at"]
+            if newest_time is None or created_at > newest_time:
+                newest, newest_time = os.path.join(path, entry), created_at
+    return newest
+
+
+def load_bundle(path: str) -> IndexSnapshot:
+    """
+    Memory-map a bundle written by `save_bundle`.
+
+    Arrays and large string columns stay in the shared mapping and are
+    paged in on demand; only the small vocabularies are decoded into this
+    process. The snapshot has no `products_df`.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest["format"] != FORMAT:
+        raise ValueError(f"Unsupported index bundle format {manifest['format']} in {path}")
+
+    params = manifest["vectorizer"]
+    vectorizer = TfidfVectorizer(**{**params, "ngram_range": tuple(params["ngram_range"])})
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(list(_load_strings(path, "vocabulary")))}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = np.asarray(_load_array(path, "idf"))
+
+    fields = {field: _load_array(path, f"store.{field}") for field in ARRAY_FIELDS}
+    fields.update({field: _load_strings(path, f"store.{field}") for field in STRING_FIELDS})
+    fields.update({field: list(fields[field]) for field in SMALL_STRING_FIELDS})
+    fields["name_tokens"] = _load_strings(path, "store.name_tokens", TokenColumn)
+    fields["columns"] = _load_columns(path, manifest["columns"])
+    fields["id_index"] = IdIndex(_load_array(path, "store.sorted_ids"), _load_array(path, "store.id_order"))
+    store = ProductStore.from_fields(fields)
+
+    groups = ProductGroups.from_arrays(
+        store, *(_load_array(path, f"groups.{field}") for field in ("group_of", "members", "indptr")))
+
+    tfidf_matrix = _load_csr(path, "tfidf_matrix", manifest["tfidf_matrix"])
+    inverted_index = _load_csr(path, "inverted_index", manifest["inverted_index"])
+    neighbors = NeighborTable.from_arrays(
+        store, groups.group_of, inverted_index,
+        *(_load_array(path, f"neighbors.{field}") for field in ("positions", "scores", "similarities", "flags")),
+        product_vectors=_load_csr(path, "product_vectors", manifest["product_vectors"]),
+        candidate_index=_load_csr(path, "candidate_index", manifest["candidate_index"]),
+        **manifest["neighbors"])
+
+    return IndexSnapshot(vectorizer, None, tfidf_matrix, inverted_index,
+                         store, groups, neighbors, manifest["version"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the search index from the DB and write it as a bundle.")
+    parser.add_argument("--out", default=os.getenv("SEARCH_INDEX_PATH", "index"),
+                        help="bundle root directory (default: $SEARCH_INDEX_PATH or ./index)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = build_snapshot(load_products_df())
+    path = save_bundle(snapshot, args.out)
+    print(f"Index bundle for {snapshot.product_store.size} products published at {path} "
+          f"in {time.perf_counter() - start:.1f}s.")
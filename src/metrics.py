@@ -0,0 +1,117 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; wide enough for a sub-millisecond lookup and a
+# full index rebuild
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus expects it."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+
+class StageMetrics:
+    """
+    Per-stage latency histograms keyed by (operation, stage), e.g.
+    ("search", "vectorize").
+
+    Recording costs two perf_counter() calls and a short locked update, so
+    it stays on in production; SEARCH_METRICS=0 turns it off.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, op: str, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((op, stage))
+            if histogram is None:
+                histogram = self._histograms[(op, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, op: str, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(op, stage, time.perf_counter() - start)
+
+    def stages(self, op: str):
+        """A StageClock for timing consecutive stages of one operation."""
+        return StageClock(self, op)
+
+    def render(self) -> str:
+        """The histograms in Prometheus text exposition format."""
+        with self._lock:
+            snapshot = [((op, stage), list(h.counts), h.sum) for (op, stage), h in sorted(self._histograms.items())]
+
+        lines = ["# HELP search_stage_seconds Time spent in each stage of an operation.",
+                 "# TYPE search_stage_seconds histogram"]
+        for (op, stage), counts, total in snapshot:
+            labels = f'op="{op}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'search_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"search_stage_seconds_sum{{{labels}}} {total!r}")
+            lines.append(f"search_stage_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class StageClock:
+    """Times back-to-back stages: each mark() closes the stage started by the previous one."""
+
+    def __init__(self, metrics: StageMetrics, op: str):
+        self.metrics = metrics
+        self.op = op
+        self.stage = None
+        self.started = time.perf_counter()
+
+    def mark(self, stage: str = None):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.metrics.observe(self.op, self.stage, now - self.started)
+        self.stage, self.started = stage, now
+
+
+def render_gauges(name: str, help_text: str, values: dict, label: str = None) -> str:
+    """
+    Flat numeric stats as Prometheus gauges: one `<name>_<key>` series per
+    key, or, with `label`, `values` maps label values to such dicts.
+    """
+    rows = {}
+    for outer, stats in (values.items() if label else [(None, values)]):
+        for key, value in (stats or {}).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            labels = f'{{{label}="{outer}"}}' if label else ""
+            rows.setdefault(key, []).append(f"{name}_{key}{labels} {value!r}")
+
+    lines = []
+    for key, series in rows.items():
+        lines.append(f"# HELP {name}_{key} {help_text}")
+        lines.append(f"# TYPE {name}_{key} gauge")
+        lines.extend(series)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+metrics = StageMetrics(enabled=os.getenv("SEARCH_METRICS", "1") != "0")
@@ -28,6 +28,7 @@ class Product(Base):
     url = Column(String)
     image_url = Column(String, nullable=True)
     last_updated = Column(DateTime, default=datetime.utcnow)
+    canonical_product_id = Column(Integer, index=True, nullable=True) # same product across stores
     
     store_id = Column(Integer, ForeignKey("stores.id"))
     store = relationship("Store", back_populates="products")
@@ -0,0 +1,295 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Nearest products scored per row, like the 50-result search recommend used
+CANDIDATES = 50
+
+# Recommendations kept per product in the table
+NEIGHBORS = 12
+
+# Rows per sparse matrix product; bounds the per-thread memory at 1M products
+BLOCK_SIZE = 128
+
+# Postings per term, and strongest terms per product, used to generate
+# candidates at index time
+MAX_POSTINGS = 256
+QUERY_TERMS = 6
+
+# Candidates taken from truncated postings per final candidate, for rescoring
+RESCORE_POOL = 2
+
+# Minimum recommendation score
+MIN_SCORE = 0.2
+
+# Reason flags, in the order the reasons are listed
+BRAND_MATCH, SAME_CATEGORY, SIMILAR_PRICE, BETTER_VALUE = 1, 2, 4, 8
+
+
+def _first_occurrence(codes, valid):
+    """Mask of entries that are valid and the first of their code in their row."""
+    n_cols = codes.shape[1]
+    # Invalid entries get distinct negative codes so they never collide
+    keyed = np.where(valid, codes, -1 - np.arange(n_cols))
+    order = np.argsort(keyed, axis=1, kind='stable')
+    ranked = np.take_along_axis(keyed, order, axis=1)
+    first_ranked = np.ones_like(ranked, dtype=bool)
+    first_ranked[:, 1:] = ranked[:, 1:] != ranked[:, :-1]
+    first = np.empty_like(first_ranked)
+    np.put_along_axis(first, order, first_ranked, axis=1)
+    return first & valid
+
+
+def truncate_rows(matrix, max_entries):
+    """Keep only the `max_entries` largest values of each CSR row."""
+    counts = np.diff(matrix.indptr)
+    if max_entries is None or counts.max(initial=0) <= max_entries:
+        return matrix
+
+    row = np.repeat(np.arange(matrix.shape[0]), counts)
+    order = np.lexsort((-matrix.data, row))
+    rank = np.arange(len(order)) - matrix.indptr[row[order]]
+    keep = np.sort(order[rank < max_entries])
+    indptr = np.concatenate([[0], np.cumsum(np.minimum(counts, max_entries))])
+    return csr_matrix((matrix.data[keep], matrix.indices[keep], indptr), shape=matrix.shape)
+
+
+def _top_per_row(positions, scores, k):
+    """
+    Best k entries of each row of padded (rows x width) arrays, best first.
+
+    Padding and excluded entries carry a score of -inf and come back as -1.
+    """
+    if positions.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        positions = np.take_along_axis(positions, part, axis=1)
+        scores = np.take_along_axis(scores, part, axis=1)
+
+    # Best score first, ties broken by the higher position
+    order = np.lexsort((-positions, -scores), axis=-1)
+    positions = np.take_along_axis(positions, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    return np.where(np.isfinite(scores), positions, -1), scores
+
+
+def nearest_candidates(rows, product_vectors, candidate_index, group_of,
+                       n_candidates=CANDIDATES, query_terms=None):
+    """
+    Most similar products for each row, excluding the row's own group.
+
+    `product_vectors` are the L2-normalised TF-IDF rows. When candidates are
+    generated approximately (truncated postings in `candidate_index` and/or
+    only the `query_terms` strongest terms of each row), a wider pool is
+    taken and rescored with exact cosine similarity.
+
+    Returns (positions, similarities) as (len(rows), n_candidates) arrays,
+    best first, padded with -1 / 0.
+    """
+    row_vectors = product_vectors[rows]
+    query_vectors = truncate_rows(row_vectors, query_terms)
+    rescore = query_vectors is not row_vectors or candidate_index.nnz != product_vectors.nnz
+    sims = (query_vectors @ candidate_index).tocsr()
+
+    # Scatter each row's scores into a padded 2-D array for vectorised top-k
+    counts = np.diff(sims.indptr)
+    owner = np.repeat(np.arange(len(rows)), counts)
+    slot = np.arange(len(owner)) - sims.indptr[owner]
+    width = max(int(counts.max(initial=0)), 1)
+    positions = np.full((len(rows), width), -1, dtype=np.int64)
+    scores = np.full((len(rows), width), -np.inf)
+    keep = (sims.data > 0) & (group_of[sims.indices] != group_of[rows[owner]])
+    positions[owner[keep], slot[keep]] = sims.indices[keep]
+    scores[owner[keep], slot[keep]] = sims.data[keep]
+
+    if rescore:
+        positions, scores = _top_per_row(positions, scores, RESCORE_POOL * n_candidates)
+        found = positions >= 0
+        pair_rows = np.broadcast_to(np.arange(len(rows))[:, None], positions.shape)[found]
+        exact = row_vectors[pair_rows].multiply(product_vectors[positions[found]]).sum(axis=1)
+        scores[found] = np.asarray(exact).ravel()
+
+    positions, scores = _top_per_row(positions, scores, n_candidates)
+    if positions.shape[1] < n_candidates:
+        pad = n_candidates - positions.shape[1]
+        positions = np.pad(positions, ((0, 0), (0, pad)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return positions, np.where(positions >= 0, scores, 0.0)
+
+
+def score_candidates(store, group_of, targets, positions, similarities):
+    """
+    Apply the recommendation rules to (targets x candidates) in one pass.
+
+    Brand match +0.4, same category +0.3, 0.3 x similarity, and -0.2 for a
+    candidate of another brand that costs over 1.5x the target. Candidates
+    repeating the target's name, an earlier candidate's name or an earlier
+    candidate's group are skipped.
+
+    Returns (scores, reason flags) with -inf for skipped or below-threshold
+    candidates.
+    """
+    valid = positions >= 0
+    cand = np.where(valid, positions, 0)
+    t = targets[:, None]
+
+    # Diversity: one entry per group and per name, in similarity order
+    valid = _first_occurrence(group_of[cand], valid)
+    valid &= store.name_key_codes[cand] != store.name_key_codes[t]
+    valid = _first_occurrence(store.name_key_codes[cand], valid)
+
+    target_brand = store.brand_key_codes[t]
+    cand_brand = store.brand_key_codes[cand]
+    target_cat = store.category_key_codes[t]
+    brand_match = (target_brand >= 0) & (cand_brand == target_brand)
+    same_category = (target_cat >= 0) & (store.category_key_codes[cand] == target_cat)
+
+    prices = np.nan_to_num(store.price, nan=0.0)
+    target_price = prices[t]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_ratio = np.where(target_price > 0, prices[cand] / target_price, 1.0)
+
+    scores = 0.4 * brand_match + 0.3 * same_category + 0.3 * similarities
+    scores -= 0.2 * ((price_ratio > 1.5) & (cand_brand != target_brand))
+
+    flags = (BRAND_MATCH * brand_match + SAME_CATEGORY * same_category
+             + SIMILAR_PRICE * ((price_ratio >= 0.8) & (price_ratio <= 1.2))
+             + BETTER_VALUE * (price_ratio < 0.8)).astype(np.uint8)
+
+    scores = np.where(valid & (scores > MIN_SCORE), scores, -np.inf)
+    return scores, flags
+
+
+def recommend_rows(store, group_of, product_vectors, candidate_index, rows,
+                   top_n=NEIGHBORS, query_terms=None):
+    """
+    Ranked recommendations for a batch of row positions.
+
+    Returns (positions, scores, similarities, flags), each (len(rows), top_n),
+    best first; unused slots have position -1.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    positions, similarities = nearest_candidates(
+        rows, product_vectors, candidate_index, group_of, query_terms=query_terms)
+    scores, flags = score_candidates(store, group_of, rows, positions, similarities)
+
+    # Highest score first; ties keep similarity order
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :top_n]
+    scores = np.take_along_axis(scores, order, axis=1)
+    found = np.isfinite(scores)
+    positions = np.where(found, np.take_along_axis(positions, order, axis=1), -1)
+    return (
+        positions,
+        np.where(found, scores, 0.0),
+        np.where(found, np.take_along_axis(similarities, order, axis=1), 0.0),
+        np.where(found, np.take_along_axis(flags, order, axis=1), 0),
+    )
+
+
+def reason_text(flags: int, brand: str) -> str:
+    """The `recommendation_reasons` string for a flag set (top 2 reasons)."""
+    reasons = []
+    if flags & BRAND_MATCH:
+        reasons.append(f"More from {brand}")
+    if flags & SAME_CATEGORY:
+        reasons.append("Same category")
+    if flags & SIMILAR_PRICE:
+        reasons.append("Similar price")
+    elif flags & BETTER_VALUE:
+        reasons.append("Better value option")
+    return " | ".join(reasons[:2])
+
+
+class NeighborTable:
+    """
+    Precomputed top-K recommendations for every product.
+
+    Built at index time with blocked sparse products of the TF-IDF rows
+    against the inverted index, spread over a thread pool (SciPy releases the
+    GIL in sparse matmul). Stored as compact int32/float32/uint8 arrays.
+
+    Very common terms would make every block nearly dense, so candidates are
+    generated from each product's `query_terms` strongest terms and each
+    term's `max_postings` strongest products, then rescored exactly. Pass
+    None for both for an exhaustive build.
+    """
+
+    def __init__(self, store, group_of, inverted_index, k=NEIGHBORS, block_size=BLOCK_SIZE,
+                 max_postings=MAX_POSTINGS, query_terms=QUERY_TERMS, n_jobs=None):
+        n = store.size
+        self._setup(store, group_of, inverted_index, max_postings, query_terms)
+        self._scoring_args()
+        self.k = k
+        self.positions = np.full((n, k), -1, dtype=np.int32)
+        self.scores = np.zeros((n, k), dtype=np.float32)
+        self.similarities = np.zeros((n, k), dtype=np.float32)
+        self.flags = np.zeros((n, k), dtype=np.uint8)
+
+        def build_block(start):
+            rows = np.arange(start, min(start + block_size, n))
+            positions, scores, sims, flags = self.score_rows(rows, k)
+            self.positions[rows] = positions
+            self.scores[rows] = scores
+            self.similarities[rows] = sims
+            self.flags[rows] = flags
+
+        with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+            list(pool.map(build_block, range(0, n, block_size)))
+
+    @classmethod
+    def from_arrays(cls, store, group_of, inverted_index, positions, scores, similarities, flags,
+                    max_postings=MAX_POSTINGS, query_terms=QUERY_TERMS,
+                    product_vectors=None, candidate_index=None):
+        """
+        A table over previously computed (e.g. memory-mapped) arrays.
+        `product_vectors` (the TF-IDF rows) and `candidate_index` (the
+        truncated postings) are derived from `inverted_index` if not given.
+        """
+        table = cls.__new__(cls)
+        table._setup(store, group_of, inverted_index, max_postings, query_terms)
+        if product_vectors is not None and candidate_index is not None:
+            table._args = (store, group_of, product_vectors, candidate_index)
+        table.k = positions.shape[1]
+        table.positions, table.scores, table.similarities, table.flags = positions, scores, similarities, flags
+        return table
+
+    def _setup(self, store, group_of, inverted_index, max_postings, query_terms):
+        self._store, self._group_of, self._inverted_index = store, group_of, inverted_index
+        self.max_postings = max_postings
+        self.query_terms = query_terms
+        self._args = None
+
+    def _scoring_args(self):
+        # Product vectors and truncated postings, derived on first use
+        if self._args is None:
+            self._args = (self._store, self._group_of, self._inverted_index.T.tocsr(),
+                          truncate_rows(self._inverted_index, self.max_postings))
+        return self._args
+
+    def score_rows(self, rows, top_n: int):
+        """Score the candidates of a batch of rows in one vectorised pass."""
+        return recommend_rows(*self._scoring_args(), rows, top_n=top_n, query_terms=self.query_terms)
+
+    def lookup(self, rows, top_n: int):
+        """
+        Recommendations for a batch of row positions, as a list (one per row)
+        of (position, score, similarity, flags) tuples, best first.
+
+        Served from the table when `top_n` fits in it; otherwise the batch is
+        scored on the fly, with scores rounded to the table's precision so a
+        product pair reports the same values either way.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if top_n <= self.k:
+            columns = (self.positions[rows, :top_n], self.scores[rows, :top_n],
+                       self.similarities[rows, :top_n], self.flags[rows, :top_n])
+        else:
+            positions, scores, sims, flags = self.score_rows(rows, top_n)
+            columns = (positions, scores.astype(self.scores.dtype), sims.astype(self.similarities.dtype), flags)
+
+        positions, scores, sims, flags = (c.tolist() for c in columns)
+        return [
+            [entry for entry in zip(positions[i], scores[i], sims[i], flags[i]) if entry[0] >= 0]
+            for i in range(len(rows))
+        ]
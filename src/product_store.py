@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from .preprocessing import clean_product_name, extract_unit_qty
+
+# Units `extract_unit_qty` can return, indexed by `ProductStore.match_unit_codes`
+MATCH_UNITS = ["", "ml", "l", "g", "kg", "pcs"]
+
+# Columns the precomputed matching features are derived from
+FEATURE_SOURCE_COLUMNS = ['name', 'quantity', 'unit']
+
+# Attributes that make up a store, for persisting it (see index_bundle)
+ARRAY_FIELDS = ['ids', 'price', 'discounted_price', 'quantity', 'store_codes', 'brand_codes',
+                'unit_codes', 'brand_key_codes', 'category_key_codes', 'name_key_codes',
+                'feature_stamps', 'match_qty', 'match_unit_codes']
+STRING_FIELDS = ['store_names', 'brands', 'units', 'brands_lower', 'names', 'urls', 'base_names']
+
+
+def intern(series: pd.Series):
+    """Encode a column as int32 codes plus its distinct values (-1 = missing)."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.int32), list(uniques)
+
+
+class ProductStore:
+    """
+    Read-only, columnar copy of the products table built at index time.
+
+    The search hot path reads plain NumPy arrays, interned codes and Python
+    lists from here instead of materialising pandas rows per candidate.
+    Row positions are the same as the rows of `tfidf_matrix`.
+
+    Matching features (unit/qty, display name, tokens) are computed once per
+    product. Each product carries a version stamp hashed from the columns the
+    features depend on; when a `previous` store is given, features of products
+    whose stamp did not change are copied over instead of recomputed.
+    """
+
+    def __init__(self, products_df: pd.DataFrame, previous: "ProductStore" = None):
+        self.size = len(products_df)
+        self.ids = products_df['id'].to_numpy()
+        # Product id -> row position
+        self.id_index = dict(zip(self.ids.tolist(), range(self.size)))
+
+        # Numeric columns used for grouping (NaN kept for missing values)
+        self.price = products_df['price'].to_numpy(dtype=np.float64)
+        self.discounted_price = products_df['discounted_price'].to_numpy(dtype=np.float64)
+        self.quantity = products_df['quantity'].to_numpy(dtype=np.float64)
+
+        # Low-cardinality strings as codes into a shared vocabulary
+        self.store_codes, self.store_names = intern(products_df['store_name'])
+        self.brand_codes, self.brands = intern(products_df['brand'])
+        self.unit_codes, self.units = intern(products_df['unit'])
+        self.brands_lower = [str(b).lower() for b in self.brands]
+
+        # Case-insensitive codes for recommendation rules (empty string = -1)
+        self.brand_key_codes, _ = intern(products_df['brand'].str.lower().replace('', None))
+        self.category_key_codes, _ = intern(products_df['category'].str.lower().replace('', None))
+
+        self.names = products_df['name'].tolist()
+        self.urls = products_df['url'].tolist()
+
+        self.feature_stamps = pd.util.hash_pandas_object(
+            products_df[FEATURE_SOURCE_COLUMNS], index=False
+        ).to_numpy()
+        self.features_recomputed = self._build_features(previous)
+        self.name_key_codes, _ = intern(pd.Series([n.lower() for n in self.base_names], dtype=object))
+
+        # Every column, for building response dicts; missing values are None
+        self.columns = []
+        for col in products_df.columns:
+            series = products_df[col]
+            if series.dtype.kind in 'biuf':
+                values = series.to_numpy()
+            else:
+                values = series.astype(object).where(series.notna(), None).tolist()
+            self.columns.append((col, values))
+
+    @classmethod
+    def from_fields(cls, fields: dict) -> "ProductStore":
+        """
+        A store from previously built attributes: every ARRAY_FIELDS and
+        STRING_FIELDS entry plus `name_tokens` and `columns`, optionally with
+        a prebuilt `id_index` (anything with a dict-like `get`).
+        """
+        store = cls.__new__(cls)
+        for name, value in fields.items():
+            setattr(store, name, value)
+        store.size = len(store.ids)
+        if 'id_index' not in fields:
+            store.id_index = dict(zip(store.ids.tolist(), range(store.size)))
+        store.features_recomputed = 0
+        return store
+
+    def _build_features(self, previous):
+        """Fill the matching feature arrays; returns how many were recomputed."""
+        n = self.size
+        self.match_qty = np.zeros(n, dtype=np.float64)
+        self.match_unit_codes = np.zeros(n, dtype=np.int8)
+        # Display name (branch suffix like "[Gulberg Branch]" removed) and the
+        # descriptive tokens used for fuzzy matching
+        self.base_names = [None] * n
+        self.name_tokens = [None] * n
+
+        reuse = np.zeros(n, dtype=bool)
+        if previous is not None and previous.size:
+            prev_pos = pd.Index(previous.ids).get_indexer(self.ids)
+            reuse = prev_pos >= 0
+            reuse[reuse] = previous.feature_stamps[prev_pos[reuse]] == self.feature_stamps[reuse]
+
+            src = prev_pos[reuse]
+            self.match_qty[reuse] = previous.match_qty[src]
+            self.match_unit_codes[reuse] = previous.match_unit_codes[src]
+            for pos, old in zip(np.flatnonzero(reuse).tolist(), src.tolist()):
+                self.base_names[pos] = previous.base_names[old]
+                self.name_tokens[pos] = previous.name_tokens[old]
+
+        stale = np.flatnonzero(~reuse).tolist()
+        for pos in stale:
+            # Look into 'unit' column first, fallback to 'name' if empty
+            unit_value = self.unit(pos)
+            raw_unit_str = f"{self.quantity[pos]} {unit_value}" if unit_value is not None else str(self.names[pos])
+            qty, unit = extract_unit_qty(raw_unit_str)
+            self.match_qty[pos] = qty
+            self.match_unit_codes[pos] = MATCH_UNITS.index(unit)
+
+            base_name = str(self.names[pos]).split('[')[0].strip()
+            self.base_names[pos] = base_name
+            self.name_tokens[pos] = frozenset(clean_product_name(base_name).split())
+
+        return len(stale)
+
+    def __len__(self):
+        return self.size
+
+    def position(self, product_id: int):
+        """Row position of a product id, or None if it is not indexed."""
+        return self.id_index.get(product_id)
+
+    def brand_lower(self, pos: int) -> str:
+        code = self.brand_codes[pos]
+        return self.brands_lower[code] if code >= 0 else ""
+
+    def unit(self, pos: int):
+        code = self.unit_codes[pos]
+        return self.units[code] if code >= 0 else None
+
+    def match_unit(self, pos: int) -> str:
+        return MATCH_UNITS[self.match_unit_codes[pos]]
+
+    def store_name(self, pos: int):
+        code = self.store_codes[pos]
+        return self.store_names[code] if code >= 0 else None
+
+    def price_entry(self, pos: int) -> dict:
+        """One store's offer for the product, as listed in `all_prices`."""
+        price = float(self.price[pos])
+        discounted_price = float(self.discounted_price[pos])
+        return {
+            "store_name": self.store_name(pos),
+            "price": price if price == price else 0.0,
+            "url": self.urls[pos],
+            "discounted_price": discounted_price if discounted_price == discounted_price else None
+        }
+
+    def record(self, pos: int) -> dict:
+        """The full product row as a plain dict, with NaN replaced by None."""
+        record = {}
+        for col, values in self.columns:
+            value = values[pos]
+            if isinstance(value, np.generic):
+                value = value.item()
+                if value != value:  # NaN
+                    value = None
+            record[col] = value
+        return record
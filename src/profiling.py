@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Frames kept per traced allocation
+TRACE_FRAMES = 10
+# Allocation sites written per profile
+TOP_ALLOCATIONS = 25
+
+# One profile at a time: tracemalloc is process-wide
+_active = threading.Lock()
+
+
+def profile_dir() -> str:
+    return os.getenv("SEARCH_PROFILE_DIR", "profiles")
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """
+    Samples Python stacks every `interval` seconds into folded-stack counts,
+    rooted at the thread name: the thread `thread_id` and every thread
+    started after the sampler (e.g. a build's worker pool), but not the
+    sampler itself.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.threads = set()
+        self._existing = {t.ident for t in threading.enumerate()} - {thread_id}
+        self._done = threading.Event()
+
+    def run(self):
+        self._existing.add(threading.get_ident())
+        while not self._done.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in self._existing:
+                    continue
+                name = names.get(ident, f"thread-{ident}").replace(";", "_")
+                self.threads.add(name)
+                self.stacks[f"{name};{_fold(frame)}"] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+@contextmanager
+def profile(label: str, directory: str = None):
+    """
+    Profile the calling thread, and threads started meanwhile, until the block
+    exits: a sampling profiler writes `<id>.folded` (folded stacks per
+    thread, for flamegraph.pl or speedscope) and tracemalloc writes the top
+    allocation sites to `<id>.alloc.txt`.
+
+    Yields the profile id, or None when another profile is running, in
+    which case the block runs unprofiled.
+    """
+    if not _active.acquire(blocking=False):
+        yield None
+        return
+    try:
+        directory = directory or profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", label).strip("_")[:60]
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}-{slug}"
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        sampler = Sampler(threading.get_ident(), float(os.getenv("SEARCH_PROFILE_INTERVAL_MS", "1")) / 1000)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield profile_id
+        finally:
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            _write(directory, profile_id, label, elapsed, sampler, before, after, peak)
+    finally:
+        _active.release()
+
+
+def _write(directory, profile_id, label, elapsed, sampler, before, after, peak):
+    with open(os.path.join(directory, f"{profile_id}.folded"), "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    with open(os.path.join(directory, f"{profile_id}.alloc.txt"), "w") as f:
+        f.write(f"label: {label}\n")
+        f.write(f"duration: {elapsed * 1000:.1f} ms\n")
+        f.write(f"samples: {sum(sampler.stacks.values())} every {sampler.interval * 1000:g} ms\n")
+        f.write(f"threads: {', '.join(sorted(sampler.threads))}\n")
+        f.write(f"peak traced memory: {peak / 1024:.1f} KiB\n")
+        f.write(f"top {TOP_ALLOCATIONS} allocation sites by net growth:\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"  {stat}\n")
+
+
+def maybe_profile(label: str, enabled: bool = False):
+    """profile(label) when `enabled` or SEARCH_PROFILE_BUILDS=1, otherwise a no-op context."""
+    if enabled or os.getenv("SEARCH_PROFILE_BUILDS") == "1":
+        return profile(label)
+    return nullcontext()
+
+
+def list_profiles(directory: str = None) -> list:
+    """Written profiles, newest first, with their files."""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = {}
+    for name in os.listdir(directory):
+        profile_id, _, kind = name.partition(".")
+        if kind not in ("folded", "alloc.txt"):
+            continue
+        path = os.path.join(directory, name)
+        entry = profiles.setdefault(profile_id, {"id": profile_id, "files": [], "bytes": 0, "modified": 0.0})
+        entry["files"].append(name)
+        entry["bytes"] += os.path.getsize(path)
+        entry["modified"] = max(entry["modified"], os.path.getmtime(path))
+    return sorted(profiles.values(), key=lambda p: p["modified"], reverse=True)
+
+
+def profile_file(name: str, directory: str = None):
+    """Path of a file listed by list_profiles(), or None."""
+    directory = directory or profile_dir()
+    if os.path.basename(name) != name or not (name.endswith(".folded") or name.endswith(".alloc.txt")):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
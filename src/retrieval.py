@@ -0,0 +1,77 @@
+import numpy as np
+from sklearn.preprocessing import normalize
+
+
+def build_inverted_index(tfidf_matrix):
+    """
+    Build a term -> product postings matrix from the TF-IDF matrix.
+
+    Rows are L2-normalised exactly like `cosine_similarity` does, so a dot
+    product against this index yields the same cosine scores.
+    """
+    return normalize(tfidf_matrix).T.tocsr()
+
+
+def select_top_k(positions, scores, k):
+    """
+    Pick the k best (position, score) pairs, best first.
+
+    Ties are broken by the higher row position first, which is the order a
+    stable `scores.argsort()[-k:][::-1]` over the full catalog produces. The
+    dense path this replaced used the default, unstable argsort, so tied
+    results may be ordered differently than they used to be.
+    """
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    if len(scores) > k:
+        # Partial selection: everything strictly above the k-th score, then
+        # fill the remaining slots with the highest positions at the cut-off.
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth)
+        at_cut = np.flatnonzero(scores == kth)
+        at_cut = at_cut[np.argsort(positions[at_cut])[::-1][:k - len(above)]]
+        chosen = np.concatenate([above, at_cut])
+        positions, scores = positions[chosen], scores[chosen]
+
+    order = np.lexsort((-positions, -scores))
+    return positions[order].astype(np.int64), scores[order].astype(np.float64)
+
+
+def top_k_similar(query_vec, inverted_index, k):
+    """
+    Return (row positions, scores) of the k rows most similar to the query.
+
+    Only products sharing at least one term with the query are scored, and
+    rows with a zero score are never returned.
+    """
+    sims = (normalize(query_vec) @ inverted_index).tocsr()
+    positions, scores = sims.indices, sims.data
+    positive = scores > 0
+    return select_top_k(positions[positive], scores[positive], k)
+
+
+def top_k_similar_batch(query_matrix, inverted_index, k):
+    """
+    `top_k_similar` for many queries at once.
+
+    All queries are scored with a single sparse-sparse product; returns one
+    (row positions, scores) pair per query row.
+    """
+    return top_k_rows(similarities(query_matrix, inverted_index), k)
+
+
+def similarities(query_matrix, inverted_index):
+    """Cosine scores of every query row against the products sharing a term with it."""
+    return (normalize(query_matrix) @ inverted_index).tocsr()
+
+
+def top_k_rows(sims, k):
+    """`select_top_k` over each row of a `similarities` matrix."""
+    results = []
+    for row in range(sims.shape[0]):
+        start, end = sims.indptr[row], sims.indptr[row + 1]
+        positions, scores = sims.indices[start:end], sims.data[start:end]
+        positive = scores > 0
+        results.append(select_top_k(positions[positive], scores[positive], k))
+    return results
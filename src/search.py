@@ -1,177 +1,335 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from .preprocessing import normalize_text, extract_unit_qty, clean_product_name
+import os
+import threading
+import time
+from .preprocessing import normalize_text
+from .metrics import metrics
+
+# The index modules (pandas, scikit-learn, SciPy) are imported when first
+# used, so importing the API stays cheap until the index is warmed up
+
+def _refresh_stages():
+    """Stages of a rebuild, as reported by refresh_status()."""
+    from .snapshot import BUILD_STAGES
+    return ["loading"] + BUILD_STAGES + ["saving"]
+
+def _snapshot_attr(name):
+    return property(lambda self: getattr(self.snapshot, name) if self.snapshot else None)
 
 class SearchEngine:
+    # Read-only views of the published snapshot
+    vectorizer = _snapshot_attr("vectorizer")
+    products_df = _snapshot_attr("products_df")
+    tfidf_matrix = _snapshot_attr("tfidf_matrix")
+    inverted_index = _snapshot_attr("inverted_index")
+    product_store = _snapshot_attr("product_store")
+    product_groups = _snapshot_attr("product_groups")
+    neighbors = _snapshot_attr("neighbors")
+    index_version = _snapshot_attr("version")
+
     def __init__(self):
-        """Initialize the search engine with TF-IDF vectorizer."""
-        self.vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self.products_df = None
-        self.tfidf_matrix = None
-        self.refresh_index()
+        """Initialize an empty search engine; the index is built by warm_up()."""
+        self.snapshot = None
+        self.shards = None
+        self._refresh_clock = None
+        self.bundle_root = os.getenv("SEARCH_INDEX_PATH")
+        self._build_lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        self._status = {"state": "idle", "stage": None, "step": 0, "steps": None,
+                        "started_at": None, "finished_at": None, "error": None}
+        self._warmup = {"state": "pending", "started_at": None, "finished_at": None, "error": None}
+
+    def warm_up(self):
+        """
+        Make the engine ready to serve. With SEARCH_INDEX_PATH set, the
+        current index bundle there is memory-mapped (shared with the other
+        workers) and the DB is not touched; otherwise, or if there is no
+        usable bundle yet, the index is built from the DB. Workers then poll
+        the bundle root every SEARCH_INDEX_POLL seconds and switch to newly
+        published bundles, also after a failed warm-up, so a worker that
+        could not reach the DB becomes ready with the first bundle.
+        """
+        from .index_bundle import find_bundle
+
+        self._warmup.update(state="warming", started_at=time.time())
+        try:
+            bundle = find_bundle(self.bundle_root) if self.bundle_root else None
+            if bundle:
+                try:
+                    self.load_bundle(bundle)
+                except Exception as e:
+                    print(f"Could not load index bundle {bundle}: {e}")
+            if self.snapshot is None:
+                self.refresh_index()
+        except Exception as e:
+            self._warmup.update(state="failed", error=str(e), finished_at=time.time())
+            raise
+        else:
+            self._warmup.update(state="ready" if self.snapshot is not None else "empty", finished_at=time.time())
+        finally:
+            interval = float(os.getenv("SEARCH_INDEX_POLL", "5"))
+            if self.bundle_root and interval > 0:
+                threading.Thread(target=self._watch_bundles, args=(interval,), name="index-watch", daemon=True).start()
+
+    def start_warm_up(self):
+        """warm_up() in a background thread, so the server can start answering probes."""
+        self._warmup["state"] = "warming"
+
+        def run():
+            try:
+                self.warm_up()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+        threading.Thread(target=run, name="index-warm-up", daemon=True).start()
+
+    def health(self) -> dict:
+        """Warm-up state and what is being served, for the readiness probe."""
+        snap = self.snapshot
+        return {
+            "ready": snap is not None,
+            "warm_up": self._warmup["state"],
+            "error": self._warmup["error"],
+            "index_version": snap.version if snap else None,
+            "products": snap.product_store.size if snap else 0,
+        }
+
+    def load_bundle(self, path: str):
+        """Publish the index snapshot persisted at `path`."""
+        from .index_bundle import load_bundle
+
+        start = time.perf_counter()
+        self._publish(load_bundle(path))
+        print(f"Search index loaded from {path} with {self.snapshot.product_store.size} products "
+              f"in {time.perf_counter() - start:.2f}s.")
+
+    def _watch_bundles(self, interval: float):
+        # Switch to bundles published by the builder or another worker
+        from .index_bundle import find_bundle
+
+        while True:
+            time.sleep(interval)
+            try:
+                path = find_bundle(self.bundle_root)
+                if path and os.path.basename(path) != self.index_version:
+                    self.load_bundle(path)
+                    if self._warmup["state"] != "ready":
+                        self._warmup.update(state="ready", error=None, finished_at=time.time())
+            except Exception:
+                import traceback
+                traceback.print_exc()
     
-    def refresh_index(self):
-        """Load products from DB and fit TF-IDF vectorizer."""
-        from .database import SessionLocal
-        from .models import Product, Store
-        
-        db = SessionLocal()
+    def refresh_index(self, profile: bool = False):
+        """
+        Load products from DB and build and publish a new index snapshot.
+        With `profile` (or SEARCH_PROFILE_BUILDS=1) the build is profiled
+        into SEARCH_PROFILE_DIR.
+        """
+        with self._build_lock:
+            return self._refresh(profile)
+
+    def start_refresh(self, profile: bool = False) -> bool:
+        """
+        Rebuild the index in a background thread. Requests keep using the
+        current snapshot at full speed until the new one is swapped in.
+        Returns False if a rebuild is already running.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._refresh(profile)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name="index-rebuild", daemon=True).start()
+        return True
+
+    def refresh_status(self) -> dict:
+        """Progress of the current or last rebuild."""
+        with self._status_lock:
+            status = dict(self._status)
+        status["index_version"] = self.index_version
+        return status
+
+    def _set_status(self, **fields):
+        stages = _refresh_stages()
+        if "stage" in fields and self._refresh_clock is not None:
+            self._refresh_clock.mark(fields["stage"])
+        with self._status_lock:
+            self._status.update(fields, steps=len(stages))
+            if "stage" in fields and fields["stage"] in stages:
+                self._status["step"] = stages.index(fields["stage"]) + 1
+
+    def _refresh(self, profile: bool = False):
+        from .profiling import maybe_profile
+
+        # Called with _build_lock held
+        with maybe_profile("refresh_index", profile):
+            return self._timed_refresh()
+
+    def _timed_refresh(self):
+        self._refresh_clock = metrics.stages("refresh")
+        self._set_status(state="running", stage="loading", started_at=time.time(), finished_at=None, error=None)
         try:
-            # Join with Store to get store name
-            query = db.query(Product, Store.name.label("store_name")).join(Store)
-            self.products_df = pd.read_sql(query.statement, db.get_bind())
-            
-            if self.products_df.empty:
-                print("Search index is empty. Please run ingestion first.")
-                return
+            published = self._build_and_publish()
+        except Exception as e:
+            # The stage that failed is not timed
+            self._refresh_clock = None
+            self._set_status(state="failed", error=str(e), finished_at=time.time())
+            raise
+        # stage=None closes the timing of the last stage
+        self._set_status(state="done" if published else "idle", stage=None, finished_at=time.time())
+        self._refresh_clock = None
+        return published
 
-            # Combine name and brand for search context
-            self.products_df['search_text'] = self.products_df['name'].fillna('') + " " + self.products_df['brand'].fillna('')
-            self.products_df['search_text'] = self.products_df['search_text'].apply(normalize_text)
+    def _build_and_publish(self):
+        from .snapshot import build_snapshot, load_products_df
+        from .index_bundle import load_bundle, save_bundle
+
+        products_df = load_products_df()
             
-            self.tfidf_matrix = self.vectorizer.fit_transform(self.products_df['search_text'])
-            print(f"Search index built with {self.products_df.shape[0]} products.")
-        finally:
-            db.close()
+        if products_df.empty:
+            print("Search index is empty. Please run ingestion first.")
+            return False
+
+        snapshot = build_snapshot(products_df, previous=self.snapshot,
+                                  progress=lambda stage: self._set_status(stage=stage))
+        print(f"Search index built with {products_df.shape[0]} products "
+              f"({snapshot.product_store.features_recomputed} features recomputed).")
+
+        # Publish it for the other workers and serve from the shared mapping
+        # rather than this process's private copy
+        if self.bundle_root:
+            self._set_status(stage="saving")
+            path = save_bundle(snapshot, self.bundle_root)
+            print(f"Search index saved to {path}.")
+            snapshot = load_bundle(path)
+
+        self._publish(snapshot)
+        return True
 
-    def search(self, query: str, top_n: int = 20):
-        print(f"DEBUG: Searching for '{query}'")
-        if self.tfidf_matrix is None:
-            print("DEBUG: TF-IDF Matrix is None")
+    def _publish(self, snapshot):
+        """
+        A single reference swap: requests that already hold the old
+        snapshot finish on it, new requests see the new one. With
+        SEARCH_SHARDS set, the new snapshot's shard processes are started
+        first; until both are swapped, requests whose snapshot and shards
+        disagree score in-process.
+        """
+        from .sharding import shards_from_env
+
+        old_shards = self.shards
+        self.shards = shards_from_env(snapshot)
+        self.snapshot = snapshot
+        if old_shards is not None:
+            old_shards.close()
+
+    def _top_k_batch(self, snap, query_matrix, top_n, clock):
+        from .retrieval import similarities, top_k_rows
+        from .sharding import gather
+
+        shards = self.shards
+        if shards is not None and shards.version == snap.version:
+            try:
+                # Shards score and select locally; only the merge is left here
+                clock.mark("similarity")
+                per_shard = shards.scatter(query_matrix, top_n)
+                clock.mark("top-k")
+                return gather(per_shard, top_n)
+            except RuntimeError:
+                # Shards closed by a concurrent swap
+                pass
+        clock.mark("similarity")
+        sims = similarities(query_matrix, snap.inverted_index)
+        clock.mark("top-k")
+        return top_k_rows(sims, top_n)
+
+    def search(self, query: str, top_n: int = 20, snapshot=None):
+        """Grouped results for `query`, from `snapshot` (default: the published one)."""
+        snap = snapshot if snapshot is not None else self.snapshot
+        if snap is None:
             return []
 
+        clock = metrics.stages("search")
+        clock.mark("normalize")
         query_norm = normalize_text(query)
-        print(f"DEBUG: Normalized query: '{query_norm}'")
         
         try:
-            query_vec = self.vectorizer.transform([query_norm])
-            
-            # Calculate cosine similarity
-            similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-            
-            # Get top indices
-            top_indices = similarities.argsort()[-top_n:][::-1]
-            
-            results = []
-            final_groups = []
+            from .grouping import group_candidates
+
+            clock.mark("vectorize")
+            query_vec = snap.vectorizer.transform([query_norm])
             
-            # Extract candidates that have some similarity
-            candidates = []
-            for idx in top_indices:
-                score = float(similarities[idx])
-                if score > 0:
-                    candidates.append({
-                        "row": self.products_df.iloc[idx],
-                        "score": score
-                    })
-
-            for cand in candidates:
-                row = cand["row"]
-                score = cand["score"]
-                
-                # Robust extraction of Unit and Qty
-                # Look into 'unit' column first, fallback to 'name' if empty
-                raw_unit_str = f"{row['quantity']} {row['unit']}" if pd.notna(row['unit']) else str(row['name'])
-                qty, unit = extract_unit_qty(raw_unit_str)
-                
-                name_raw = str(row['name']).split('[')[0].strip()
-                brand = str(row['brand']).lower() if pd.notna(row['brand']) else ""
-                
-                # Descriptive-cleaned name for token matching
-                name_trimmed = clean_product_name(name_raw)
-                tokens = set(name_trimmed.split())
-                
-                price = float(row['price']) if pd.notna(row['price']) else 0.0
-                
-                store_info = {
-                    "store_name": row['store_name'],
-                    "price": price,
-                    "url": row['url'],
-                    "discounted_price": float(row['discounted_price']) if pd.notna(row['discounted_price']) else None
-                }
-                
-                found_group = False
-                for group in final_groups:
-                    # 1. Compare Units and Qty (Crucial)
-                    if group['unit'] == unit and abs(group['qty'] - qty) < 0.001:
-                        # 2. Compare Brand
-                        if brand == group['brand'] and brand != "":
-                            # Exact brand match + same unit = Highly likely same product
-                            # Even if name differs slightly (e.g. 'Milkpak' vs 'Milkpak Full Cream')
-                            common = tokens.intersection(group['tokens'])
-                            if len(common) > 0: # At least one core word in common
-                                # Handle branch duplicates: only keep the lowest price per store
-                                existing = next((s for s in group['all_prices'] if s['store_name'] == store_info['store_name']), None)
-                                if existing:
-                                    if store_info['price'] < existing['price']:
-                                        existing.update(store_info)
-                                else:
-                                    group['all_prices'].append(store_info)
-                                    
-                                group['min_price'] = min(group['min_price'], price)
-                                if score > group['similarity_score']:
-                                    group['similarity_score'] = score
-                                found_group = True
-                                break
-                        
-                        # 3. No brand match / generic: Check price window and high token overlap
-                        if group['min_price'] > 0 and (0.6 <= (price / group['min_price']) <= 1.6):
-                            overlap = len(tokens.intersection(group['tokens'])) / max(len(tokens), len(group['tokens']))
-                            if overlap > 0.6:
-                                # Handle branch duplicates
-                                existing = next((s for s in group['all_prices'] if s['store_name'] == store_info['store_name']), None)
-                                if existing:
-                                    if store_info['price'] < existing['price']:
-                                        existing.update(store_info)
-                                else:
-                                    group['all_prices'].append(store_info)
-
-                                group['min_price'] = min(group['min_price'], price)
-                                if score > group['similarity_score']:
-                                    group['similarity_score'] = score
-                                found_group = True
-                                break
-                
-                if not found_group:
-                    product = {k: (None if pd.isna(v) else v) for k, v in row.to_dict().items()}
-                    product['name'] = name_raw
-                    product['similarity_score'] = score
-                    product['all_prices'] = [store_info]
-                    
-                    final_groups.append({
-                        **product,
-                        "tokens": tokens,
-                        "brand": brand,
-                        "unit": unit,
-                        "qty": qty,
-                        "min_price": price
-                    })
+            # Cosine similarity over products sharing a term with the query,
+            # then partial top-k selection (best first)
+            top_indices, top_scores = self._top_k_batch(snap, query_vec, top_n, clock)[0]
             
-            # Sort prices within each group and clean up metadata
-            for g in final_groups:
-                g['all_prices'] = sorted(g['all_prices'], key=lambda x: x['price'])
-                for key in ['tokens', 'min_price', 'qty']:
-                    g.pop(key, None)
-
-            print(f"DEBUG: Found {len(final_groups)} fuzzy grouped matches (from {len(candidates)} candidates)")
+            # Extract candidates that have some similarity, then group them
+            clock.mark("grouping")
+            candidates = list(zip(top_indices.tolist(), top_scores.tolist()))
+            final_groups = group_candidates(snap.product_store, candidates)
+            clock.mark()
             return final_groups
         except Exception as e:
-            print(f"DEBUG: Error in search: {e}")
+            print(f"Search failed for {query!r}: {e}")
             import traceback
             traceback.print_exc()
             return []
 
+    def search_many(self, queries, top_n: int = 20, snapshot=None):
+        """search() for many queries, vectorised and scored in one pass."""
+        snap = snapshot if snapshot is not None else self.snapshot
+        if snap is None:
+            return [[] for _ in queries]
+
+        try:
+            from .grouping import group_candidates
+
+            clock = metrics.stages("search_batch")
+            clock.mark("normalize")
+            normalized = [normalize_text(q) for q in queries]
+            clock.mark("vectorize")
+            query_matrix = snap.vectorizer.transform(normalized)
+            hits = self._top_k_batch(snap, query_matrix, top_n, clock)
+            clock.mark("grouping")
+            results = [
+                group_candidates(snap.product_store, list(zip(positions.tolist(), scores.tolist())))
+                for positions, scores in hits
+            ]
+            clock.mark()
+            return results
+        except Exception as e:
+            print(f"Batch search of {len(queries)} queries failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return [[] for _ in queries]
+
     def search_by_id(self, product_id: int):
-        if self.products_df is None:
+        store = self.product_store
+        if store is None:
             return None
-        match = self.products_df[self.products_df['id'] == product_id]
-        if match.empty:
+        pos = store.position(product_id)
+        if pos is None:
             return None
         
-        # Convert to dict and replace NaN with None
-        row = match.iloc[0]
-        return {k: (None if pd.isna(v) else v) for k, v in row.to_dict().items()}
+        # Plain dict with NaN replaced by None
+        return store.record(pos)
+
+    def product_group(self, product_id: int, snapshot=None):
+        """The product with all its cross-store prices, from the group index."""
+        snap = snapshot if snapshot is not None else self.snapshot
+        if snap is None:
+            return None
+        groups = snap.product_groups
+        pos = groups.store.position(product_id)
+        if pos is None:
+            return None
+        return groups.group(pos)
 
 # Singleton instance
 search_engine = SearchEngine()
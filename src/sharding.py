@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from .index_bundle import _load_array, _load_csr, _save_array, _save_csr
+from .retrieval import select_top_k
+
+# The shard served by this process: (postings, global row positions)
+_shard = None
+
+
+def _open_shard(path, shape):
+    global _shard
+    _shard = (_load_csr(path, "postings", shape), _load_array(path, "positions"))
+
+
+def _shard_size():
+    return len(_shard[1])
+
+
+def _shard_top_k(queries, k):
+    # `queries` are already L2-normalised
+    postings, positions = _shard
+    sims = (queries @ postings).tocsr()
+    results = []
+    for row in range(sims.shape[0]):
+        start, end = sims.indptr[row], sims.indptr[row + 1]
+        local, scores = sims.indices[start:end], sims.data[start:end]
+        positive = scores > 0
+        # Global positions, so ties break exactly as over the whole catalog
+        results.append(select_top_k(positions[local[positive]], scores[positive], k))
+    return results
+
+
+def merge_top_k(parts, k):
+    """Global top-k from the shards' local top-k (position, score) arrays."""
+    positions = np.concatenate([p for p, _ in parts])
+    scores = np.concatenate([s for _, s in parts])
+    return select_top_k(positions, scores, k)
+
+
+def gather(per_shard, k):
+    """Merge `ShardedIndex.scatter` output into one (positions, scores) pair per query row."""
+    return [merge_top_k([hits[row] for hits in per_shard], k) for row in range(len(per_shard[0]))]
+
+
+def partition(store, n_shards: int, by: str = "hash"):
+    """Shard number of every product row."""
+    if by == "store":
+        # Whole stores per shard, largest store onto the emptiest shard
+        counts = np.bincount(store.store_codes)
+        shard_of_store = np.zeros(len(counts), dtype=np.int64)
+        load = np.zeros(n_shards, dtype=np.int64)
+        for code in np.argsort(-counts, kind="stable"):
+            shard = int(np.argmin(load))
+            shard_of_store[code] = shard
+            load[shard] += counts[code]
+        return shard_of_store[store.store_codes]
+    if by == "hash":
+        return np.asarray(store.ids, dtype=np.int64) % n_shards
+    raise ValueError(f"Unknown shard key {by!r}; use 'hash' or 'store'")
+
+
+class ShardedIndex:
+    """
+    The inverted index split by product across worker processes.
+
+    Each shard process memory-maps its slice of the postings and returns a
+    local top-k; the caller merges them into the global top-k, so one
+    search uses up to `n_shards` cores. Results are identical to scoring
+    the whole index in-process.
+    """
+
+    def __init__(self, snapshot, n_shards: int, by: str = "hash"):
+        self.version = snapshot.version
+        self.n_shards = n_shards
+        self.by = by
+        self._dir = tempfile.mkdtemp(prefix="search-shards-")
+        self._pools = []
+
+        shard_of = partition(snapshot.product_store, n_shards, by)
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            for shard in range(n_shards):
+                path = os.path.join(self._dir, str(shard))
+                os.makedirs(path)
+                positions = np.flatnonzero(shard_of == shard)
+                shape = _save_csr(path, "postings", snapshot.inverted_index[:, positions].tocsr())
+                _save_array(path, "positions", positions)
+                self._pools.append(ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                                       initializer=_open_shard, initargs=(path, shape)))
+            # Start the processes now rather than on the first search
+            self.sizes = [f.result() for f in [pool.submit(_shard_size) for pool in self._pools]]
+        except Exception:
+            self.close()
+            raise
+
+    def scatter(self, query_matrix, k):
+        """Every shard's local top-k for every query row, indexed [shard][row]."""
+        queries = normalize(query_matrix)
+        futures = [pool.submit(_shard_top_k, queries, k) for pool in self._pools]
+        return [f.result() for f in futures]
+
+    def top_k_batch(self, query_matrix, k):
+        """One (positions, scores) pair per query row, as `top_k_similar_batch`."""
+        return gather(self.scatter(query_matrix, k), k)
+
+    def top_k(self, query_vec, k):
+        return self.top_k_batch(query_vec, k)[0]
+
+    def close(self):
+        # Lets searches already sent to the shards finish
+        for pool in self._pools:
+            pool.shutdown(wait=True)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {"version": self.version, "shards": self.n_shards, "by": self.by, "sizes": self.sizes}
+
+
+def shards_from_env(snapshot, prefix: str = "SEARCH_SHARDS"):
+    """A ShardedIndex with <prefix> shards split by <prefix>_BY, or None when <prefix> is unset or 1."""
+    n_shards = int(os.getenv(prefix, "0"))
+    if n_shards <= 1:
+        return None
+    return ShardedIndex(snapshot, n_shards, by=os.getenv(f"{prefix}_BY", "hash"))
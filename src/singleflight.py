@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key.
+
+    The first caller for a key runs the computation; callers arriving while
+    it is in flight wait for it and share its result (or its exception).
+    Nothing is kept once the call finishes, so results are cached elsewhere.
+    Calls are coroutines on one event loop, so waiting callers hold no
+    thread.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.executions = self.shared = 0
+
+    async def do_async(self, key, fn):
+        """
+        `await fn()` once per key in flight; concurrent callers await its
+        result. If the leading caller is cancelled, a waiting one takes over.
+        """
+        while True:
+            with self._lock:
+                future = self._futures.get(key)
+                leader = future is None
+                if leader:
+                    future = self._futures[key] = asyncio.get_running_loop().create_future()
+                    self.executions += 1
+                else:
+                    self.shared += 1
+
+            if not leader:
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    continue
+
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Retrieved here, so an error nobody waited for is not logged
+                future.exception()
+                raise
+            finally:
+                with self._lock:
+                    del self._futures[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._futures),
+                "executions": self.executions,
+                "shared": self.shared,
+            }
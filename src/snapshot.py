@@ -0,0 +1,108 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .preprocessing import normalize_text
+from .retrieval import build_inverted_index
+from .product_store import ProductStore
+from .grouping import ProductGroups
+from .clustering import cluster_products
+from .neighbors import NeighborTable
+
+# Build stages reported through the `progress` callback
+BUILD_STAGES = ["fingerprint", "vectorize", "product store", "grouping", "neighbours"]
+
+# TF-IDF settings, also used to restore a persisted vectorizer
+VECTORIZER_PARAMS = {"max_features": 5000, "ngram_range": (1, 2)}
+
+
+def load_products_df() -> pd.DataFrame:
+    """The products table joined with store names, straight from the DB."""
+    from .database import SessionLocal
+    from .models import Product, Store
+
+    db = SessionLocal()
+    try:
+        # Join with Store to get store name
+        query = db.query(Product, Store.name.label("store_name")).join(Store)
+        return pd.read_sql(query.statement, db.get_bind())
+    finally:
+        db.close()
+
+
+def catalog_version(products_df: pd.DataFrame) -> str:
+    """Content fingerprint of the catalog: the same in every worker and only
+    changes when the products do."""
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(products_df, index=False).to_numpy().tobytes()
+    ).hexdigest()[:16]
+
+
+class IndexSnapshot:
+    """
+    Everything one search index build produced, published as a unit.
+
+    A snapshot is never modified after it is built: a rebuild creates a new
+    one (with its own vectorizer) and the engine swaps a single reference,
+    so a request that grabbed a snapshot sees a consistent DataFrame,
+    matrix, product arrays and version throughout.
+    """
+
+    __slots__ = ("vectorizer", "products_df", "tfidf_matrix", "inverted_index",
+                 "product_store", "product_groups", "neighbors", "version")
+
+    def __init__(self, vectorizer, products_df, tfidf_matrix, inverted_index,
+                 product_store, product_groups, neighbors, version):
+        self.vectorizer = vectorizer
+        self.products_df = products_df
+        self.tfidf_matrix = tfidf_matrix
+        self.inverted_index = inverted_index
+        self.product_store = product_store
+        self.product_groups = product_groups
+        self.neighbors = neighbors
+        self.version = version
+
+
+def build_snapshot(products_df: pd.DataFrame, previous: IndexSnapshot = None, progress=None,
+                   vectorizer_params: dict = None) -> IndexSnapshot:
+    """
+    Build a complete index snapshot from the products table.
+
+    `previous` lets the product store reuse unchanged matching features;
+    `progress(stage)` is called as each of BUILD_STAGES starts.
+    `vectorizer_params` replaces VECTORIZER_PARAMS, e.g. to evaluate a
+    smaller vocabulary.
+    """
+    report = progress or (lambda stage: None)
+
+    report("fingerprint")
+    version = catalog_version(products_df)
+
+    # Combine name and brand for search context
+    products_df['search_text'] = products_df['name'].fillna('') + " " + products_df['brand'].fillna('')
+    products_df['search_text'] = products_df['search_text'].apply(normalize_text)
+
+    report("vectorize")
+    vectorizer = TfidfVectorizer(**(vectorizer_params or VECTORIZER_PARAMS))
+    tfidf_matrix = vectorizer.fit_transform(products_df['search_text'])
+    inverted_index = build_inverted_index(tfidf_matrix)
+
+    # Matching features are only recomputed for products that changed;
+    # the store also holds the product id -> row position index
+    report("product store")
+    product_store = ProductStore(products_df, previous=previous.product_store if previous else None)
+
+    # Cross-store groups from the offline clustering; cluster in memory
+    # if the catalog has not been (fully) clustered yet
+    report("grouping")
+    canonical_ids = products_df.get('canonical_product_id')
+    if canonical_ids is None or canonical_ids.isna().any():
+        canonical_ids = cluster_products(products_df)
+    product_groups = ProductGroups(product_store, np.asarray(canonical_ids))
+
+    # Item-to-item recommendations for every product
+    report("neighbours")
+    neighbors = NeighborTable(product_store, product_groups.group_of, inverted_index)
+
+    return IndexSnapshot(vectorizer, products_df, tfidf_matrix, inverted_index,
+                         product_store, product_groups, neighbors, version)